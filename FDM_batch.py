@@ -0,0 +1,303 @@
+import os
+import contextlib
+from collections import namedtuple
+
+import numpy as np
+
+from FDM_pattern import AreaTrack, pattern_config
+
+
+# Pattern types the batch engine produces; `BatchPatterns.pattern_type` indexes it
+PATTERN_TYPES = ('single', 'alternating', 'cycle', 'markov')
+
+# Knobs whose models the vectorized engine does not cover; with any of them
+# on, series are replayed through the scalar record path instead
+_SCALAR_KNOBS = ('cycle_detection', 'markov_enabled', 'tracker_enabled', 'change_detection')
+
+# Per-prefix results, each array aligned with the flat `values` passed in:
+# entry j describes the series after the interval values[j] was recorded.
+# Times are in seconds from the series' first onset; NaN stands for None.
+BatchPatterns = namedtuple('BatchPatterns', 'pattern_type established average_interval '
+                                            'alt_interval_a alt_interval_b '
+                                            'single_effective_interval target_time')
+
+
+def _pad_series(values, offsets):
+    """Ragged series (flat `values`, `offsets` of length n_series + 1) as a
+    NaN-padded (n_series, max_len) matrix plus the series lengths."""
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n = lengths.size
+    width = int(lengths.max()) if n else 0
+    padded = np.full((n, width), np.nan)
+    rows = np.repeat(np.arange(n), lengths)
+    cols = np.arange(values.size) - np.repeat(offsets[:-1], lengths)
+    padded[rows, cols] = values[offsets[0]:offsets[-1]]
+    return padded, lengths
+
+
+def _sample_std(window, mean):
+    """Row-wise sample standard deviation (0.0 below two values)."""
+    n = window.shape[1]
+    if n < 2:
+        return np.zeros(window.shape[0])
+    return np.sqrt(((window - mean[:, None]) ** 2).sum(axis=1) / (n - 1))
+
+
+def _trimmed_mean(window, frac):
+    """Row-wise RollingStats.trimmed_mean over equally long windows."""
+    n = window.shape[1]
+    k = max(1, int(n * frac))
+    if n <= 2 * k:
+        return window.mean(axis=1)
+    return np.sort(window, axis=1)[:, k:n - k].mean(axis=1)
+
+
+def _masked_stats(window, mask):
+    """Row-wise count, mean and sample stdev of the `mask`ed window values."""
+    count = mask.sum(axis=1)
+    safe = np.maximum(count, 1)
+    mean = np.where(mask, window, 0.0).sum(axis=1) / safe
+    dev = np.where(mask, window - mean[:, None], 0.0)
+    std = np.where(count > 1, np.sqrt((dev * dev).sum(axis=1) / np.maximum(count - 1, 1)), 0.0)
+    return count, mean, std
+
+
+def _effective_single(cfg, avg, recent):
+    """Row-wise _effective_single_interval for averages `avg` and the last
+    `fast_min_window_n` intervals `recent`."""
+    eff = avg.copy()
+    if cfg.fast_gap_use_min:
+        floor = float(cfg.min_interval_abs)
+        candidates = np.where(recent >= floor, recent, np.inf).min(axis=1)
+        use = (avg < float(cfg.fast_gap_threshold)) & np.isfinite(candidates)
+        eff[use] = candidates[use]
+    eff[~(avg != 0.0)] = np.nan
+    return eff
+
+
+def _general_case(cfg, x, i):
+    """The non-sticky calculate_pattern_v2 branch for rows `x` at interval i.
+
+    Returns (alternating, established, average, a, b, refresh_eff) per row;
+    refresh_eff marks rows where a single pattern (re)established and the
+    effective single interval is recomputed.
+    """
+    n = i + 1
+    window_n = max(2, int(cfg.ab_window_n))
+    trim = float(cfg.ab_trim_frac)
+    window = x[:, max(0, n - 2 * window_n):n]
+    # Parity windows: the last window_n intervals of even / odd index
+    last_even = i if i % 2 == 0 else i - 1
+    last_odd = i if i % 2 == 1 else i - 1
+    even = x[:, max(0, last_even - 2 * (window_n - 1)):last_even + 1:2]
+    odd = x[:, max(1, last_odd - 2 * (window_n - 1)):last_odd + 1:2] if last_odd >= 1 else x[:, :0]
+
+    mean_all = window.mean(axis=1)
+    std_all = _sample_std(window, mean_all)
+    cv_overall = np.where(mean_all > 0, std_all / np.where(mean_all > 0, mean_all, 1.0) * 100, 100.0)
+
+    rows = x.shape[0]
+    alt = np.zeros(rows, dtype=bool)
+    a = np.full(rows, np.nan)
+    b = np.full(rows, np.nan)
+    even_mean = even.mean(axis=1) if even.shape[1] else np.full(rows, np.nan)
+    odd_mean = odd.mean(axis=1) if odd.shape[1] else np.full(rows, np.nan)
+    if even.shape[1] >= 2 and odd.shape[1] >= 2:
+        mean_even = _trimmed_mean(even, trim)
+        mean_even = np.where(mean_even != 0.0, mean_even, even_mean)
+        mean_odd = _trimmed_mean(odd, trim)
+        mean_odd = np.where(mean_odd != 0.0, mean_odd, odd_mean)
+        std_even = _sample_std(even, even_mean)
+        std_odd = _sample_std(odd, odd_mean)
+        cv_even = np.where(mean_even > 0, std_even / np.where(mean_even > 0, mean_even, 1.0) * 100, 100.0)
+        cv_odd = np.where(mean_odd > 0, std_odd / np.where(mean_odd > 0, mean_odd, 1.0) * 100, 100.0)
+        top = np.maximum(mean_even, mean_odd)
+        distinct = np.where(top > 0, np.abs(mean_even - mean_odd) / np.where(top > 0, top, 1.0) * 100, 0.0)
+        alt = (((cv_even < 22) & (cv_odd < 22) & (distinct > 15))
+               | ((window.shape[1] >= 4) & (distinct > 30) & (np.maximum(cv_even, cv_odd) < 30)))
+        a = np.where(alt, mean_even, a)
+        b = np.where(alt, mean_odd, b)
+
+    # Fallback A/B via threshold + flip rate, parity-aligned
+    if window.shape[1] >= 6:
+        thr = np.median(window, axis=1)
+        labels = window > thr[:, None]
+        flip_rate = (labels[:, 1:] != labels[:, :-1]).sum(axis=1) / (window.shape[1] - 1)
+        n_low, mean_low, std_low = _masked_stats(window, ~labels)
+        n_high, mean_high, std_high = _masked_stats(window, labels)
+        cv_low = np.where(mean_low > 0, std_low / np.where(mean_low > 0, mean_low, 1.0) * 100, 100.0)
+        cv_high = np.where(mean_high > 0, std_high / np.where(mean_high > 0, mean_high, 1.0) * 100, 100.0)
+        top = np.maximum(mean_high, mean_low)
+        distinct2 = np.where(top > 0, np.abs(mean_high - mean_low) / np.where(top > 0, top, 1.0) * 100, 0.0)
+        parity_split = np.abs(even_mean - odd_mean) >= 0.5 * (mean_high - mean_low)
+        fallback = (~alt & (n_low > 0) & (n_high > 0) & (flip_rate > 0.65) & (distinct2 > 25)
+                    & (np.maximum(cv_low, cv_high) < 28) & (np.minimum(n_low, n_high) >= 3)
+                    & parity_split)
+        alt |= fallback
+        a = np.where(fallback, even_mean, a)
+        b = np.where(fallback, odd_mean, b)
+
+    single_ok = ~alt & (cv_overall < 10)
+    return alt, alt | single_ok, mean_all, a, b, single_ok
+
+
+def _nan(value):
+    return np.nan if value is None else float(value)
+
+
+def _replayed_patterns(self, values, offsets):
+    """BatchPatterns from replaying every series through record_gray_appearance_safe.
+
+    Series s becomes onsets at 0 and the running sums of its intervals,
+    fed one by one to a scratch AreaTrack: its own pattern state, the
+    detector's knobs, so the detector's pattern is left untouched. Entry j
+    is the state after the onset ending values[j] was offered (an onset the
+    spurious-interval filter drops leaves the state unchanged).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    start = int(offsets[0]) if offsets.size else 0
+    size = int(offsets[-1]) - start if offsets.size else 0
+    out = {name: np.full(size, np.nan) for name in BatchPatterns._fields}
+    out['pattern_type'] = np.zeros(size, dtype=np.int8)
+    out['established'] = np.zeros(size, dtype=bool)
+    # The scalar code reports every onset; keep the replay quiet
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        track = AreaTrack(self, None, auto_predict=self.auto_predict)
+        for s in range(offsets.size - 1):
+            track.reset_pattern_learning()
+            track.ab_phase_ms = self.ab_phase_ms
+            series = values[offsets[s]:offsets[s + 1]]
+            j = int(offsets[s]) - start
+            track.record_gray_appearance_safe(0.0)
+            for ts in np.cumsum(series):
+                track.record_gray_appearance_safe(float(ts))
+                alt = track.pattern_type == "alternating"
+                out['pattern_type'][j] = PATTERN_TYPES.index(track.pattern_type)
+                out['established'][j] = bool(track.pattern_established)
+                out['average_interval'][j] = _nan(track.average_interval)
+                out['alt_interval_a'][j] = _nan(track.alt_interval_a if alt else None)
+                out['alt_interval_b'][j] = _nan(track.alt_interval_b if alt else None)
+                out['single_effective_interval'][j] = _nan(track.single_effective_interval)
+                out['target_time'][j] = _nan(track.predict_next_target_time())
+                j += 1
+    return BatchPatterns(**out)
+
+
+def analyze_pattern_batch(self, values, offsets):
+    """calculate_pattern_v2 and predict_next_target_time over every prefix of
+    many interval series at once.
+
+    `values` holds the recorded intervals of all series back to back and
+    series s is values[offsets[s]:offsets[s + 1]]. Each series is replayed
+    from an empty pattern with the knobs of `self`. Returns BatchPatterns.
+
+    With cycle_detection, markov_enabled, tracker_enabled and
+    change_detection off and predictor_mode 'pattern' only the single and
+    A/B logic applies, and the loop runs over the interval position with
+    every step vectorized across the series, so path-dependent state (the
+    sticky single-interval EMA, held A/B means) evolves exactly as in the
+    scalar code. Intervals are then taken as recorded (after the
+    spurious-interval filter). With any other setting, including the
+    defaults, each series is replayed through the scalar record path
+    instead (see _replayed_patterns), so results are always those of the
+    live code, at scalar speed. `ab_phase_ms` is held at its current value.
+    """
+    cfg = pattern_config(self)
+    if cfg.predictor_mode != 'pattern' or any(getattr(cfg, name) for name in _SCALAR_KNOBS):
+        return _replayed_patterns(self, values, offsets)
+    x, lengths = _pad_series(values, offsets)
+    n_series, width = x.shape
+    onsets = np.concatenate([np.zeros((n_series, 1)), np.nancumsum(x, axis=1)], axis=1)
+
+    # Per-series learned state, as calculate_pattern_v2 keeps it on the detector
+    alt = np.zeros(n_series, dtype=bool)
+    established = np.zeros(n_series, dtype=bool)
+    avg = np.full(n_series, np.nan)
+    a = np.full(n_series, np.nan)
+    b = np.full(n_series, np.nan)
+    eff = np.full(n_series, np.nan)
+
+    out = {name: np.full((n_series, width), np.nan) for name in BatchPatterns._fields}
+    out['pattern_type'] = np.zeros((n_series, width), dtype=np.int8)
+    out['established'] = np.zeros((n_series, width), dtype=bool)
+
+    min_samples = int(cfg.min_samples)
+    fast_n = max(1, int(cfg.fast_min_window_n))
+    ab_lead = max(0.0, float(cfg.ab_lead_ms) / 1000.0)
+    phase = 0.001 * float(getattr(self, 'ab_phase_ms', 0) or 0)
+    phase = max(-0.050, min(0.050, phase))
+    pre_frac = float(cfg.ab_classify_margin_frac)
+    margin_min = float(cfg.ab_classify_margin_ms_min) / 1000.0
+    horizon = int(cfg.target_horizon_cycles)
+
+    for i in range(width):
+        n = i + 1
+        active = np.nonzero(lengths > i)[0]
+        if n >= min_samples and active.size:
+            xa = x[active, :n]
+            recent = xa[:, max(0, n - fast_n):n]
+            sticky = ~alt[active] & established[active] & (avg[active] != 0.0) & ~np.isnan(avg[active])
+            if sticky.any():
+                rows = active[sticky]
+                last = x[rows, i]
+                cur = avg[rows]
+                ok = (0.5 * cur <= last) & (last <= 1.5 * cur)
+                avg[rows] = np.where(ok, 0.8 * cur + 0.2 * last, cur)
+                eff[rows] = _effective_single(cfg, avg[rows], recent[sticky])
+            general = ~sticky
+            if general.any():
+                rows = active[general]
+                g_alt, g_est, g_avg, g_a, g_b, g_single = _general_case(cfg, xa[general], i)
+                alt[rows] = g_alt
+                established[rows] = g_est
+                avg[rows] = g_avg
+                a[rows] = np.where(g_alt, g_a, a[rows])
+                b[rows] = np.where(g_alt, g_b, b[rows])
+                if g_single.any():
+                    eff[rows[g_single]] = _effective_single(cfg, g_avg[g_single], recent[general][g_single])
+
+        out['pattern_type'][active, i] = alt[active]
+        out['established'][active, i] = established[active]
+        out['average_interval'][active, i] = avg[active]
+        out['alt_interval_a'][active, i] = np.where(alt[active], a[active], np.nan)
+        out['alt_interval_b'][active, i] = np.where(alt[active], b[active], np.nan)
+        out['single_effective_interval'][active, i] = eff[active]
+
+        # predict_next_target_time
+        last_time = onsets[active, n]
+        target = np.full(active.size, np.nan)
+        est = established[active]
+        single = est & ~alt[active]
+        delta = np.where(np.isnan(eff[active]), avg[active], eff[active])
+        target[single] = last_time[single] + delta[single]
+        ab_rows = est & alt[active] & (a[active] != 0.0) & (b[active] != 0.0) & (n >= 2 * int(cfg.ab_min_pairs))
+        if ab_rows.any():
+            ra = a[active][ab_rows]
+            rb = b[active][ab_rows]
+            fast = np.minimum(ra, rb)
+            slow = np.maximum(ra, rb)
+            last_iv = x[active[ab_rows], i]
+            margin = np.maximum(margin_min, pre_frac * np.abs(slow - fast))
+            by_value_fast = (np.abs(last_iv - fast) + 1e-6) < (np.abs(last_iv - slow) - margin)
+            by_parity_fast = (ra <= rb) == (i % 2 == 0)
+            last_was_fast = by_value_fast | by_parity_fast
+            lead = ab_lead + np.where(slow < 0.35, np.minimum(0.010, (0.35 - slow) * 0.08), 0.0)
+            base = last_time[ab_rows]
+            aim = np.where(last_was_fast, np.maximum(base, base + slow - lead - phase), np.nan)
+            if horizon >= 1:
+                # Roll over to the first projected slow onset (project_targets)
+                first = np.where(n % 2 == 0, ra, rb)
+                second = np.where(n % 2 == 0, rb, ra)
+                onset = np.where(np.abs(first - slow) < np.abs(first - fast), base + first,
+                                 np.where(np.abs(second - slow) < np.abs(second - fast),
+                                          base + first + second, np.nan))
+                rolled = np.maximum(base, onset - lead - phase)
+                aim = np.where(last_was_fast, aim, rolled)
+            target[ab_rows] = aim
+        out['target_time'][active, i] = target
+
+    valid = np.arange(width)[None, :] < lengths[:, None]
+    return BatchPatterns(**{name: out[name][valid] for name in BatchPatterns._fields})
@@ -0,0 +1,756 @@
+"""Micro-benchmarks for the detection hot path.
+
+Run `python FDM_benchmark.py`; works headless (no screen capture, no keys).
+Each classifier backend is checked for parity against the reference HSV
+path before it is timed.
+"""
+import os
+import time
+import contextlib
+import threading
+import tracemalloc
+import numpy as np
+
+import FDM_batch as fdm_batch
+import FDM_detection as fdm_detection
+import FDM_pattern as fdm_pattern
+import FDM_scheduler as fdm_scheduler
+import FDM_stats as fdm_stats
+from FDM_predictive_detector import PredictiveTimingDetector
+
+
+BACKENDS = ("hsv", "lut", "cv")
+SHAPES = ((15, 20), (30, 50), (120, 160))
+
+
+def _sample_frames(shape, count, channels, seed=0):
+    """Mix of white, gray, partially gray and noisy ROI frames."""
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    frames = np.empty((count, h, w, channels), dtype=np.uint8)
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            frames[i] = 235
+        elif kind == 1:
+            frames[i] = 128
+        elif kind == 2:
+            frames[i] = 235
+            frames[i, :, : max(1, w // 4)] = 128
+        else:
+            frames[i] = rng.integers(0, 256, (h, w, channels), dtype=np.uint8)
+    if channels == 4:
+        frames[..., 3] = 255
+    return frames
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the pattern code's per-event prints inside the block."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _knobs(detector, *names):
+    """Current values of the named detector knobs, for _set_knobs to restore."""
+    return {name: getattr(detector, name) for name in names}
+
+
+def _set_knobs(detector, **knobs):
+    """Set detector knobs and re-snapshot the detection config they feed."""
+    for name, value in knobs.items():
+        setattr(detector, name, value)
+    detector.refresh_detection_config()
+
+
+def _time_per_frame(fn, frames, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for frame in frames:
+            fn(frame)
+        best = min(best, (time.perf_counter() - t0) / len(frames))
+    return best
+
+
+def check_parity(detector, frames, backend):
+    """Assert that `backend` gives the same counts as "hsv" on every frame."""
+    saved = _knobs(detector, "classifier_backend")
+    mismatches = 0
+    for frame in frames:
+        _set_knobs(detector, classifier_backend="hsv")
+        ref = fdm_detection._gray_white_counts(detector, frame)
+        _set_knobs(detector, classifier_backend=backend)
+        got = fdm_detection._gray_white_counts(detector, frame)
+        if ref != got:
+            mismatches += 1
+    _set_knobs(detector, **saved)
+    assert mismatches == 0, f"{backend} disagrees with hsv on {mismatches}/{len(frames)} frames"
+
+
+def bench_classifiers(detector, shapes=SHAPES, count=2000):
+    """Print per-frame classify_region_state cost for each backend (full scans).
+
+    The "fastest" column is where opting in to a non-default backend pays off.
+    """
+    saved = _knobs(detector, "classifier_backend", "gray_early_exit")
+    _set_knobs(detector, gray_early_exit=False)
+    print("\nclassify_region_state per-frame cost (us)")
+    print(f"{'roi':>10} {'fmt':>5} " + " ".join(f"{b:>9}" for b in BACKENDS) + f" {'fastest':>8}   parity")
+    for shape in shapes:
+        for channels, fmt in ((3, "RGB"), (4, "BGRA")):
+            frames = _sample_frames(shape, count, channels)
+            costs = []
+            for backend in BACKENDS:
+                if backend != "hsv":
+                    check_parity(detector, frames, backend)
+                _set_knobs(detector, classifier_backend=backend)
+                # Warm up (also builds lookup tables outside the timing)
+                detector.classify_region_state(frames[0])
+                costs.append(_time_per_frame(detector.classify_region_state, frames))
+            _set_knobs(detector, classifier_backend="hsv")
+            label = f"{shape[0]}x{shape[1]}"
+            fastest = BACKENDS[int(np.argmin(costs))]
+            print(f"{label:>10} {fmt:>5} " + " ".join(f"{c * 1e6:9.1f}" for c in costs)
+                  + f" {fastest:>8}   ok")
+    _set_knobs(detector, **saved)
+
+
+def _classified(detector, frames):
+    """(state, gray, white, total, exact) per frame from classify_region_state."""
+    rows = []
+    for f in frames:
+        state = detector.classify_region_state(f)
+        rows.append((state, detector.last_gray_count, detector.last_white_count,
+                     detector.last_total_px, detector.last_counts_exact))
+    return rows
+
+
+def bench_early_exit(detector, shapes=SHAPES, count=2000, checked=200):
+    """Compare full-scan vs early-exit classification on onset and white frames.
+
+    On the first `checked` frames of each set the early-exit states must
+    equal the full scan's; counts must equal it when reported exact, and
+    when partial (last_counts_exact False, which coverage tracking sees)
+    must not exceed it and must still reach the gray threshold. Raises
+    AssertionError otherwise.
+    """
+    print("\nfast_gray_mode early exit per-frame cost (us)")
+    saved = _knobs(detector, "classifier_backend", "gray_early_exit")
+    print(f"{'roi':>10} {'frames':>8} {'full':>9} {'early':>9}   parity")
+    mismatched = []
+    try:
+        _set_knobs(detector, classifier_backend="hsv")
+        for shape in shapes:
+            h, w = shape
+            onset = np.full((count, h, w, 4), 235, dtype=np.uint8)
+            # First gray pixels appear at the leading edge of the ROI
+            onset[:, : max(1, h // 8), : max(1, w // 8), :3] = 128
+            white = np.full((count, h, w, 4), 235, dtype=np.uint8)
+            for name, frames in (("onset", onset), ("white", white)):
+                costs = []
+                results = []
+                for early in (False, True):
+                    _set_knobs(detector, gray_early_exit=early)
+                    results.append(_classified(detector, frames[:checked]))
+                    costs.append(_time_per_frame(detector.classify_region_state, frames))
+                ok = True
+                for full, part in zip(*results):
+                    if part[0] != full[0]:
+                        ok = False
+                    elif part[4]:
+                        ok = ok and part[1:4] == full[1:4]
+                    else:
+                        min_gray = max(1, int(detector.gray_min_pixels),
+                                       int(part[3] * float(detector.gray_min_fraction)))
+                        ok = ok and (part[1] <= full[1] and part[2] <= full[2]
+                                     and part[1] >= min_gray)
+                label = f"{h}x{w}"
+                if not ok:
+                    mismatched.append(f"{label} {name}")
+                print(f"{label:>10} {name:>8} {costs[0] * 1e6:9.1f} {costs[1] * 1e6:9.1f}   "
+                      + ("ok" if ok else "MISMATCH"))
+    finally:
+        _set_knobs(detector, **saved)
+    assert not mismatched, "early exit disagrees with the full scan: " + ", ".join(mismatched)
+
+
+def bench_wake_jitter(detector, backends=("hsv", "cv"), shape=(120, 160), duration_s=1.0, repeat=3):
+    """Measure press-thread wake jitter while the main thread classifies flat out.
+
+    A helper thread mimics the scheduler's spin-wait (sleep 0.5 ms, check
+    the clock) and records how late each wake-up is. The "idle" row is the
+    baseline with no classification load. Each row is the median over
+    `repeat` runs, since single runs are dominated by scheduler noise.
+    On the machines measured so far "cv" does not wake the press threads
+    measurably earlier than "hsv" (single runs have shown its p99 both
+    lower and several times higher); its gain is frame throughput.
+    """
+    print(f"\npress-thread wake lateness under classification load ({shape[0]}x{shape[1]} BGRA, ms,"
+          f" median of {repeat})")
+    print(f"{'load':>8} {'p50':>7} {'p99':>7} {'max':>7} {'frames':>8}")
+    frames = _sample_frames(shape, 64, 4)
+    saved = _knobs(detector, "classifier_backend", "gray_early_exit")
+    _set_knobs(detector, gray_early_exit=False)
+    for backend in ("idle",) + tuple(backends):
+        runs = []
+        for _ in range(repeat):
+            lateness = []
+            stop = threading.Event()
+
+            def waker():
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    time.sleep(0.0005)
+                    lateness.append(time.perf_counter() - t0 - 0.0005)
+
+            t = threading.Thread(target=waker, daemon=True)
+            t.start()
+            n = 0
+            end = time.perf_counter() + duration_s
+            if backend == "idle":
+                time.sleep(duration_s)
+            else:
+                _set_knobs(detector, classifier_backend=backend)
+                while time.perf_counter() < end:
+                    detector.classify_region_state(frames[n % len(frames)])
+                    n += 1
+            stop.set()
+            t.join()
+            late = np.asarray(lateness) * 1000.0
+            runs.append((np.percentile(late, 50), np.percentile(late, 99), late.max(), n))
+        p50, p99, worst, n = np.median(np.asarray(runs), axis=0)
+        print(f"{backend:>8} {p50:7.3f} {p99:7.3f} {worst:7.3f} {int(n):8d}")
+    _set_knobs(detector, **saved)
+
+
+def bench_batch(detector, shapes=SHAPES, count=8192, chunk_size=1024):
+    """Compare per-frame classify_region_state calls with classify_frames.
+
+    Besides RGB and BGRA stacks, covers a learned active-pixel mask and
+    fast_gray_mode off. Raises AssertionError if the batch states or counts
+    (array or generator input) differ from the per-frame path.
+    """
+    variants = (("RGB", 3, False, True), ("BGRA", 4, False, True),
+                ("mask", 4, True, True), ("dominant", 4, False, False))
+    print("\nper-frame calls vs classify_frames (frames/s)")
+    print(f"{'roi':>10} {'frames':>8} {'single':>10} {'batch':>10} {'gen':>10}   parity")
+    saved = _knobs(detector, "gray_early_exit", "fast_gray_mode")
+    saved_mask = detector.active_idx, detector._active_shape
+    rng = np.random.default_rng(0)
+    mismatched = []
+    try:
+        for shape in shapes:
+            for name, channels, masked, fast_gray in variants:
+                # Full scans, so the per-frame counts are exact like the batch ones
+                _set_knobs(detector, gray_early_exit=False, fast_gray_mode=fast_gray)
+                if masked:
+                    size = shape[0] * shape[1]
+                    detector.active_idx = np.sort(rng.choice(size, max(1, size // 3), replace=False)).astype(np.intp)
+                    detector._active_shape = shape
+                else:
+                    detector.active_idx = None
+                frames = _sample_frames(shape, count, channels)
+                single = []
+                counts = np.empty((count, 3), dtype=np.int64)
+                t0 = time.perf_counter()
+                for i, f in enumerate(frames):
+                    single.append(detector.classify_region_state(f))
+                    counts[i] = detector.last_gray_count, detector.last_white_count, detector.last_total_px
+                t_single = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                batch = detector.classify_frames(frames, chunk_size)
+                t_batch = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                gen = detector.classify_frames((f for f in frames), chunk_size)
+                t_gen = time.perf_counter() - t0
+                ok = ([fdm_detection.STATE_NAMES[c] for c in batch[0]] == single
+                      and np.array_equal(np.stack(batch[1:], axis=1), counts)
+                      and all(np.array_equal(a, b) for a, b in zip(batch, gen)))
+                label = f"{shape[0]}x{shape[1]}"
+                if not ok:
+                    mismatched.append(f"{label} {name}")
+                print(f"{label:>10} {name:>8} {count / t_single:10.0f} {count / t_batch:10.0f} "
+                      f"{count / t_gen:10.0f}   " + ("ok" if ok else "MISMATCH"))
+    finally:
+        detector.active_idx, detector._active_shape = saved_mask
+        detector._active_buf = None
+        _set_knobs(detector, **saved)
+    assert not mismatched, "classify_frames disagrees with classify_region_state: " + ", ".join(mismatched)
+
+
+def bench_pattern_update(detector, lengths=(10, 100, 1000, 10000), repeat=200):
+    """Per-onset calculate_pattern_v2 cost as the session's interval history grows.
+
+    The window statistics are incremental, so the cost should stay flat
+    with history length.
+    """
+    print("\ncalculate_pattern_v2 per-onset cost vs history length (us)")
+    print(f"{'intervals':>10} {'cost':>9}")
+    detector.auto_predict = False
+    rng = np.random.default_rng(0)
+    history = list(np.where(np.arange(max(lengths) + repeat) % 2 == 0, 0.3, 0.6)
+                   * (1.0 + 0.02 * rng.standard_normal(max(lengths) + repeat)))
+    for n in lengths:
+        with _quiet():
+            detector.reset_pattern_learning()
+            for v in history[:n]:
+                detector.pattern.add_onset(0.0, float(v))
+            fdm_pattern.calculate_pattern_v2(detector)
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                detector.pattern.add_onset(0.0, float(history[n + i]))
+                fdm_pattern.calculate_pattern_v2(detector)
+        elapsed = time.perf_counter() - t0
+        print(f"{n:>10} {elapsed / repeat * 1e6:9.1f}")
+    detector.auto_predict = True
+    detector.reset_pattern_learning()
+
+
+def bench_cycle_detection(cycles=((0.3, 0.6), (0.3, 0.3, 0.6), (0.3, 0.45, 0.6),
+                                  (0.2, 0.2, 0.2, 0.5)), jitter_s=0.01, trials=50, repeat=500):
+    """Intervals needed before detect_cycle locks onto each cycle, and its cost.
+
+    Intervals follow the cycle with Gaussian jitter; "lock" is the first
+    window (up to `cycle_window_n` intervals) that yields the right length.
+    """
+    print(f"\ncycle detection (jitter {jitter_s * 1000:.0f}ms): intervals to lock, cost per call")
+    print(f"{'cycle':>24} {'k':>3} {'p50':>5} {'p90':>5} {'us':>8}")
+    rng = np.random.default_rng(0)
+    window = 36
+    for cycle in cycles:
+        k = len(cycle)
+        locks = []
+        for _ in range(trials):
+            x = np.resize(cycle, 12 * k) + jitter_s * rng.standard_normal(12 * k)
+            lock = None
+            for n in range(2, x.size + 1):
+                lo = max(0, n - window)
+                found = fdm_stats.detect_cycle(x[lo:n], start=lo)
+                if found is not None and found[0] == k:
+                    lock = n
+                    break
+            locks.append(lock if lock is not None else x.size + 1)
+        x = list(x[-window:])
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fdm_stats.detect_cycle(x)
+        cost = (time.perf_counter() - t0) / repeat
+        label = "/".join(f"{v:g}" for v in cycle)
+        print(f"{label:>24} {k:3d} {np.percentile(locks, 50):5.0f} {np.percentile(locks, 90):5.0f} {cost * 1e6:8.1f}")
+
+
+def _prediction_errors(detector, onsets, meas_s=0.001, covered=None):
+    """Feed `onsets` to record_gray_appearance_safe; return predict_next_gray errors (s).
+
+    Each onset gets `meas_s` Gaussian measurement noise. The error is NaN
+    while no pattern is established. If `covered` is a list, whether each
+    tracked onset fell inside the tracker's window is appended to it.
+    """
+    rng = np.random.default_rng(0)
+    errors = []
+    with _quiet():
+        detector.reset_pattern_learning()
+        for t in onsets:
+            if detector.pattern_established:
+                if covered is not None:
+                    tracked = fdm_pattern._tracked_onset(detector)
+                    if tracked is not None:
+                        covered.append(abs(tracked[0] - t) <= tracked[1])
+                errors.append(detector.predict_next_gray() - t)
+            else:
+                errors.append(float('nan'))
+            detector.frame_ts_ns = int(t * 1e9)
+            detector.record_gray_appearance_safe(t + meas_s * rng.standard_normal())
+    detector.frame_ts_ns = None
+    return np.asarray(errors)
+
+
+def bench_tracker(detector, cases=(((0.5,), 0.0), ((0.5,), -0.01), ((0.5,), 0.01),
+                                    ((0.3, 0.6), -0.01), ((0.3, 0.3, 0.6), -0.01)),
+                  duration_s=40.0, skip=10):
+    """Next-onset prediction error with and without the onset tracker.
+
+    Feeds simulator ground-truth onsets through _prediction_errors and
+    compares predict_next_gray against the true next onset, skipping the
+    first `skip` predictions. Drift is the relative period change per
+    second (negative: speeding up).
+    """
+    from FDM_simulator import WheelSimulator
+    print("\nnext-onset prediction error, tracker vs EMA/window means (ms)")
+    print(f"{'pattern':>14} {'drift':>7} {'rms on':>8} {'rms off':>8} {'covered':>8}")
+    saved = detector.tracker_enabled, detector.predictor_mode
+    # Fixed precedence, so "off" really is the EMA/window means
+    detector.predictor_mode = "pattern"
+    for periods, drift in cases:
+        sim = WheelSimulator(periods=periods, duration_s=duration_s, drift_per_s=drift, realtime=False)
+        rms = []
+        covered = []
+        for enabled in (True, False):
+            detector.tracker_enabled = enabled
+            err = _prediction_errors(detector, sim.onsets, covered=covered if enabled else None)
+            err = err[~np.isnan(err)][skip:] * 1000.0
+            rms.append(float(np.sqrt(np.mean(err * err))) if err.size else float('nan'))
+        label = "/".join(f"{v:g}" for v in periods)
+        print(f"{label:>14} {drift:7.3f} {rms[0]:8.2f} {rms[1]:8.2f} {np.mean(covered) * 100:7.0f}%")
+    detector.tracker_enabled, detector.predictor_mode = saved
+    detector.reset_pattern_learning()
+
+
+def bench_change_recovery(detector, cases=(((0.5,), 0.7), ((0.5,), 1.2), ((0.3, 0.6), 0.7),
+                                           ((0.3, 0.3, 0.6), 0.7), ((0.3, 0.3, 0.6), 1.2)),
+                          change_s=15.0, duration_s=40.0, tol_ms=5.0, run=5):
+    """Onsets until predictions recover after an abrupt speed change.
+
+    The period is multiplied by `factor` at `change_s`. Recovery is the
+    first onset after the change from which `run` predictions in a row
+    are within `tol_ms`; "-" means it never recovered. One column per
+    predictor_mode with change detection on, and "off" for change
+    detection off under the fixed "pattern" precedence. Raises
+    AssertionError if any mode recovers later than "off".
+    """
+    from FDM_simulator import WheelSimulator
+    modes = ("pattern", "best", "blend")
+    print(f"\nonsets to recover after a speed change (within {tol_ms:g}ms, {run} in a row)")
+    print(f"{'pattern':>14} {'factor':>7}" + "".join(f"{m:>8}" for m in modes) + f"{'off':>8}")
+    saved = detector.change_detection, detector.predictor_mode
+    slower = []
+    for periods, factor in cases:
+        sim = WheelSimulator(periods=periods, duration_s=duration_s,
+                             speed_changes=[(change_s, factor)], realtime=False)
+        after = int(np.searchsorted(sim.onsets, change_s))
+        hits = []
+        for enabled, mode in [(True, m) for m in modes] + [(False, "pattern")]:
+            detector.change_detection = enabled
+            detector.predictor_mode = mode
+            err = _prediction_errors(detector, sim.onsets)[after:]
+            good = np.abs(err) * 1000.0 < tol_ms
+            hits.append(next((i for i in range(good.size - run + 1) if good[i:i + run].all()), None))
+        label = "/".join(f"{v:g}" for v in periods)
+        print(f"{label:>14} {factor:7.2f}" + "".join(f"{'-' if h is None else h:>8}" for h in hits))
+        off = float('inf') if hits[-1] is None else hits[-1]
+        for mode, hit in zip(modes, hits):
+            if (float('inf') if hit is None else hit) > off:
+                slower.append(f"{label} x{factor:g} {mode}")
+    detector.change_detection, detector.predictor_mode = saved
+    detector.reset_pattern_learning()
+    assert not slower, "change detection recovers slower than off: " + ", ".join(slower)
+
+
+def _markov_sequence(rules, durations, count, jitter_s=0.004, seed=0):
+    """Intervals from a second-order chain over duration classes.
+
+    `rules` maps (class before last, last class) to the probabilities of
+    each next class.
+    """
+    rng = np.random.default_rng(seed)
+    labels = [0, 0]
+    while len(labels) < count:
+        p = rules[(labels[-2], labels[-1])]
+        labels.append(int(rng.choice(len(p), p=p)))
+    return np.asarray(durations)[labels] + jitter_s * rng.standard_normal(count)
+
+
+def bench_markov(detector, count=200, tol_ms=20.0):
+    """Next-onset hit rate on irregular but structured interval sequences.
+
+    A hit is a prediction within `tol_ms` of the true onset; predictions
+    that could not be made (no pattern) count as misses.
+    """
+    cases = (
+        ("S-S-L, L-S-S/L", {(0, 0): (0.05, 0.95), (0, 1): (1.0, 0.0),
+                            (1, 0): (0.7, 0.3), (1, 1): (1.0, 0.0)}),
+        ("S-L-L-S runs", {(0, 0): (0.0, 1.0), (0, 1): (0.0, 1.0),
+                          (1, 1): (1.0, 0.0), (1, 0): (0.8, 0.2)}),
+        ("random S/L", {(0, 0): (0.5, 0.5), (0, 1): (0.5, 0.5),
+                        (1, 0): (0.5, 0.5), (1, 1): (0.5, 0.5)}),
+    )
+    print(f"\nnext-onset hit rate on irregular sequences (within {tol_ms:g}ms)")
+    print(f"{'sequence':>16} {'markov':>8} {'off':>8}")
+    saved = detector.markov_enabled
+    for name, rules in cases:
+        onsets = 0.1 + np.concatenate([[0.0], np.cumsum(_markov_sequence(rules, (0.3, 0.6), count))])
+        rates = []
+        for enabled in (True, False):
+            detector.markov_enabled = enabled
+            err = _prediction_errors(detector, onsets, meas_s=0.0)[20:]
+            rates.append(np.mean(np.abs(np.nan_to_num(err, nan=1.0)) * 1000.0 < tol_ms) * 100.0)
+        print(f"{name:>16} {rates[0]:7.0f}% {rates[1]:7.0f}%")
+    detector.markov_enabled = saved
+    detector.reset_pattern_learning()
+
+
+def bench_predictors(detector, cases=(((0.5,), 0.0), ((0.5,), -0.01), ((0.3, 0.6), 0.0),
+                                        ((0.3, 0.6), -0.01), ((0.3, 0.45, 0.6), 0.0)),
+                     duration_s=40.0, skip=10, repeat=2000):
+    """Next-onset error per predictor_mode, and the registry's per-onset cost.
+
+    "pattern" is the fixed precedence (tracker once settled); "best" and
+    "blend" choose from the predictor registry by backtested error. The
+    last row is the S-S-L Markov sequence of bench_markov, as a hit rate
+    within 20ms. The cost is one _score_predictors plus
+    _refresh_predictions call on an established pattern.
+    """
+    from FDM_simulator import WheelSimulator
+    modes = ("pattern", "best", "blend")
+    print("\nnext-onset prediction error by predictor_mode (rms ms)")
+    print(f"{'pattern':>14} {'drift':>7}" + "".join(f"{m:>9}" for m in modes) + "   chosen")
+    saved = detector.predictor_mode
+    for periods, drift in cases:
+        sim = WheelSimulator(periods=periods, duration_s=duration_s, drift_per_s=drift, realtime=False)
+        cells = []
+        for mode in modes:
+            detector.predictor_mode = mode
+            err = _prediction_errors(detector, sim.onsets)
+            err = err[~np.isnan(err)][skip:] * 1000.0
+            cells.append(float(np.sqrt(np.mean(err * err))) if err.size else float('nan'))
+            if mode == "best":
+                chosen = detector.active_predictor
+        label = "/".join(f"{v:g}" for v in periods)
+        print(f"{label:>14} {drift:7.3f}" + "".join(f"{c:9.2f}" for c in cells) + f"   {chosen}")
+    rules = {(0, 0): (0.05, 0.95), (0, 1): (1.0, 0.0), (1, 0): (0.7, 0.3), (1, 1): (1.0, 0.0)}
+    onsets = 0.1 + np.concatenate([[0.0], np.cumsum(_markov_sequence(rules, (0.3, 0.6), 200))])
+    cells = []
+    for mode in modes:
+        detector.predictor_mode = mode
+        err = _prediction_errors(detector, onsets, meas_s=0.0)[20:]
+        cells.append(np.mean(np.abs(np.nan_to_num(err, nan=1.0)) * 1000.0 < 20.0) * 100.0)
+    print(f"{'S-S-L markov':>14} {'':>7}" + "".join(f"{c:8.0f}%" for c in cells))
+    state = detector.pattern
+    interval = detector.intervals[-1]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fdm_pattern._score_predictors(state, interval)
+        fdm_pattern._refresh_predictions(detector)
+    cost_us = (time.perf_counter() - t0) / repeat * 1e6
+    print(f"registry cost: {cost_us:.1f}us per onset for {len(fdm_pattern.PREDICTORS)} predictors")
+    detector.predictor_mode = saved
+    detector.reset_pattern_learning()
+
+
+def bench_rollover(detector, cases=((0.25,), (0.2, 0.35), (0.2, 0.2, 0.35)), duration_s=60.0,
+                   latency_s=0.005, hiccup_p=0.2, seed=0):
+    """Press opportunities per minute with and without multi-cycle targets.
+
+    Each onset is detected `latency_s` late, and with probability
+    `hiccup_p` up to 1.5 periods later still (a processing hiccup). At
+    each detection the target is taken as the scheduler would: the
+    predicted target if its press time is still ahead, else (with
+    rollover) the earliest projected target still ahead. Opportunities
+    are the distinct onsets targeted per minute.
+    """
+    from FDM_simulator import WheelSimulator
+    print(f"\npress opportunities per minute, {hiccup_p * 100:.0f}% of detections hiccup")
+    print(f"{'pattern':>14} {'horizon 0':>10} {'horizon 3':>10}")
+    saved = detector.target_horizon_cycles
+    rng = np.random.default_rng(seed)
+    for periods in cases:
+        sim = WheelSimulator(periods=periods, duration_s=duration_s, realtime=False)
+        onsets = np.asarray(sim.onsets)
+        hiccups = rng.random(onsets.size) < hiccup_p
+        late = latency_s + hiccups * rng.uniform(0.0, 1.5 * max(periods), onsets.size)
+        cells = []
+        for horizon in (0, 3):
+            detector.target_horizon_cycles = horizon
+            targeted = set()
+            with _quiet():
+                detector.reset_pattern_learning()
+                for t, lag in zip(onsets, late):
+                    detector.frame_ts_ns = int(t * 1e9)
+                    detector.record_gray_appearance_safe(t)
+                    now = t + lag
+                    aim = detector.predict_next_target_time()
+                    targets = []
+                    if aim is not None:
+                        targets.append(fdm_pattern.PressTarget(aim, detector._not_before_time, None,
+                                                               detector._last_target_interval))
+                    for target in targets + detector.project_targets():
+                        press = fdm_scheduler._target_press_time(
+                            detector, target.time, target.not_before, target.interval, 0.0)
+                        if press > now:
+                            targeted.add(int(np.argmin(np.abs(onsets - target.time))))
+                            break
+            cells.append(len(targeted) * 60.0 / duration_s)
+        label = "/".join(f"{v:g}" for v in periods)
+        print(f"{label:>14} {cells[0]:10.1f} {cells[1]:10.1f}")
+    detector.target_horizon_cycles = saved
+    detector.frame_ts_ns = None
+    detector.reset_pattern_learning()
+
+
+def _batch_series(count, seed=0):
+    """Ragged interval series mixing steady, A/B, drifting, switching, noisy and cyclic wheels."""
+    rng = np.random.default_rng(seed)
+    series = []
+    for s in range(count):
+        n = int(rng.integers(3, 120))
+        kind = s % 6
+        base = rng.uniform(0.15, 0.8)
+        if kind == 0:
+            iv = np.full(n, base)
+        elif kind == 1:
+            iv = np.where(np.arange(n) % 2 == 0, base, base * rng.uniform(1.3, 2.5))
+        elif kind == 2:
+            iv = base * (1.0 + rng.uniform(-0.005, 0.005) * np.arange(n))
+        elif kind == 3:
+            iv = np.where(np.arange(n) < n // 2, base, base * rng.uniform(0.6, 1.6))
+        elif kind == 4:
+            iv = rng.uniform(0.5 * base, 2.0 * base, n)
+        else:
+            iv = np.resize([base, base, base * rng.uniform(1.5, 2.5)], n)
+        series.append(np.maximum(0.09, iv + rng.normal(0.0, rng.uniform(0.0, 0.02), n)))
+    offsets = np.concatenate([[0], np.cumsum([len(v) for v in series])])
+    return np.concatenate(series), offsets
+
+
+def _scalar_prefixes(detector, intervals):
+    """Pattern state and predict_next_target_time after every interval, one series.
+
+    Replays the onsets through record_gray_appearance_safe, the path live
+    monitoring takes, starting from an empty pattern at t=0.
+    """
+    rows = []
+    detector.reset_pattern_learning()
+    for n, ts in enumerate(np.concatenate([[0.0], np.cumsum(intervals)])):
+        detector.frame_ts_ns = int(ts * 1e9)
+        detector.record_gray_appearance_safe(float(ts))
+        if n == 0:
+            continue
+        assert detector.gray_timestamps[-1] == ts, f"interval {intervals[n - 1]:.3f}s filtered as spurious"
+        alt = detector.pattern_type == "alternating"
+        target = detector.predict_next_target_time()
+        rows.append((fdm_batch.PATTERN_TYPES.index(detector.pattern_type), bool(detector.pattern_established),
+                     detector.average_interval,
+                     detector.alt_interval_a if alt else None, detector.alt_interval_b if alt else None,
+                     detector.single_effective_interval, target))
+    detector.frame_ts_ns = None
+    return rows
+
+
+def check_batch_parity(detector, count=400, seed=0):
+    """Assert that analyze_pattern_batch matches the scalar record path.
+
+    Replays `count` ragged series through both, once with the default
+    knobs (scalar replay inside the batch call) and once with the knobs the
+    vectorized engine covers (no cycle/Markov/tracker/change detection,
+    predictor_mode 'pattern'), and reports mismatching prefixes and the
+    speedup. Also asserts that the batch call leaves the detector's own
+    pattern alone. Raises AssertionError on any mismatch.
+    """
+    vectorized = dict(cycle_detection=False, markov_enabled=False, tracker_enabled=False,
+                      change_detection=False, predictor_mode="pattern", auto_predict=False)
+    saved = {name: getattr(detector, name) for name in vectorized}
+    values, offsets = _batch_series(count, seed)
+    print(f"\nbatch pattern analysis vs scalar ({count} series, {values.size} prefixes)")
+    print(f"{'knobs':>10}" + "".join(f"{name[:12]:>13}" for name in fdm_batch.BatchPatterns._fields)
+          + f"{'scalar ms':>11}{'batch ms':>10}")
+    bad = {}
+    try:
+        for label, knobs in (("default", {}), ("vectorized", vectorized)):
+            for name, value in knobs.items():
+                setattr(detector, name, value)
+            with _quiet():
+                detector.reset_pattern_learning()
+            pattern = detector.pattern
+            t0 = time.perf_counter()
+            batch = detector.analyze_pattern_batch(values, offsets)
+            batch_s = time.perf_counter() - t0
+            assert detector.pattern is pattern and not pattern.timestamps, \
+                "analyze_pattern_batch changed the detector's pattern"
+            t0 = time.perf_counter()
+            scalar = []
+            with _quiet():
+                for s in range(count):
+                    scalar.extend(_scalar_prefixes(detector, values[offsets[s]:offsets[s + 1]]))
+            scalar_s = time.perf_counter() - t0
+            expected = [np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+                        for column in zip(*scalar)]
+            mismatches = []
+            for name, want in zip(fdm_batch.BatchPatterns._fields, expected):
+                got = np.asarray(getattr(batch, name), dtype=np.float64)
+                same = np.isclose(got, want, rtol=1e-9, atol=1e-12) | (np.isnan(got) & np.isnan(want))
+                mismatches.append(int((~same).sum()))
+                if mismatches[-1]:
+                    bad[f"{label} {name}"] = mismatches[-1]
+            print(f"{label:>10}" + "".join(f"{m:13d}" for m in mismatches)
+                  + f"{scalar_s * 1000:11.0f}{batch_s * 1000:10.0f}")
+    finally:
+        for name, value in saved.items():
+            setattr(detector, name, value)
+        with _quiet():
+            detector.reset_pattern_learning()
+    assert not bad, f"batch/scalar mismatches: {bad}"
+
+
+def check_steady_state_allocations(detector, shape=(120, 160), count=2000, budget_bytes=4096):
+    """Assert that the per-frame classify path does not allocate frame-sized arrays.
+
+    Runs region_unchanged / classify_region_state / track_gray_coverage over
+    changing BGRA frames for every backend and reports, via tracemalloc, the
+    peak transient allocation above the warmed-up baseline and the net growth
+    after `count` frames. Small Python objects (ints, tuples, array views)
+    remain; anything the size of a mask or HSV image would exceed the budget.
+    Fails (AssertionError) once the table is printed if any backend does.
+    """
+    print(f"\nsteady-state allocations per frame ({shape[0]}x{shape[1]} BGRA, bytes)")
+    print(f"{'backend':>8} {'early':>6} {'peak':>9} {'growth':>9}   result")
+    frames = _sample_frames(shape, 64, 4)
+    saved = _knobs(detector, "classifier_backend", "gray_early_exit")
+    failed = []
+    try:
+        for backend in BACKENDS:
+            for early in (False, True):
+                _set_knobs(detector, classifier_backend=backend, gray_early_exit=early)
+
+                def step(frame):
+                    if not detector.region_unchanged(frame):
+                        detector.current_state = detector.classify_region_state(frame)
+                        detector.track_gray_coverage()
+
+                for frame in frames:
+                    step(frame)
+                tracemalloc.start()
+                try:
+                    tracemalloc.reset_peak()
+                    base, _ = tracemalloc.get_traced_memory()
+                    for n in range(count):
+                        step(frames[n % len(frames)])
+                    current, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                peak_bytes = peak - base
+                growth = current - base
+                passed = peak_bytes <= budget_bytes and growth <= budget_bytes
+                if not passed:
+                    failed.append(f"{backend} (early={early}): peak {peak_bytes}, growth {growth}")
+                print(f"{backend:>8} {str(early):>6} {peak_bytes:9d} {growth:9d}   "
+                      + ("ok" if passed else "over budget"))
+    finally:
+        _set_knobs(detector, **saved)
+    assert not failed, "per-frame allocations over budget: " + "; ".join(failed)
+
+
+def main():
+    detector = PredictiveTimingDetector(headless=True)
+    t0 = time.perf_counter()
+    _set_knobs(detector, classifier_backend="lut")
+    fdm_detection._class_lut(detector)
+    print(f"LUT build ({1 << (3 * detector.lut_bits)} entries): {(time.perf_counter() - t0) * 1000:.0f}ms")
+    _set_knobs(detector, classifier_backend="hsv")
+    bench_classifiers(detector)
+    bench_early_exit(detector)
+    bench_wake_jitter(detector)
+    bench_batch(detector)
+    bench_pattern_update(detector)
+    bench_cycle_detection()
+    bench_tracker(detector)
+    bench_change_recovery(detector)
+    bench_markov(detector)
+    bench_predictors(detector)
+    bench_rollover(detector)
+    check_batch_parity(detector)
+    check_steady_state_allocations(detector)
+
+
+if __name__ == "__main__":
+    main()
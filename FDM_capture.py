@@ -1,22 +1,301 @@
 import time
+import threading
 import numpy as np
 
 
+def _update_fps(self):
+    """Count one captured frame and refresh `self.current_fps` once a second."""
+    self.fps_counter += 1
+    current_time = time.time()
+    if current_time - self.fps_start_time >= 1.0:
+        self.current_fps = self.fps_counter
+        self.fps_counter = 0
+        self.fps_start_time = current_time
+
+
 def ultra_fast_capture(self):
     """Fast screen capture using `self.sct` and `self.monitor`.
 
-    Updates FPS counters stored on `self`.
+    Updates FPS counters stored on `self` and the capture instant in
+    `self.frame_ts_ns`.
     """
+    t0 = time.perf_counter_ns()
     img = self.sct.grab(self.monitor)
+    t1 = time.perf_counter_ns()
     frame = np.frombuffer(img.rgb, dtype=np.uint8).reshape(img.height, img.width, 3)
+    self.frame_ts_ns = (t0 + t1) // 2
 
     # Update FPS
-    self.fps_counter += 1
-    current_time = time.time()
-    if current_time - self.fps_start_time >= 1.0:
-        self.current_fps = self.fps_counter
-        self.fps_counter = 0
-        self.fps_start_time = current_time
+    _update_fps(self)
+
+    return frame
+
+
+def publish_governor_target(self):
+    """Publish the governor's burst target for the capture thread.
+
+    Runs on the main thread (from _process_state) and stores
+    `(next_onset, window)` in `self.governor_target`, or None while
+    learning or without an established prediction. The window is the
+    larger of `governor_burst_ms` and `governor_burst_frac` of the upcoming
+    interval (the shortest one for alternating, cycle and Markov patterns),
+    so jittery patterns get a wider window. The tuple is replaced in one
+    assignment, so governor_delay never sees a half-updated target nor
+    touches the pattern state that relearn/reset swap out. It is only
+    recomputed after a new onset, a pattern swap or a mode change.
+    """
+    state = self.pattern
+    key = (state, state.timestamps.total, self.learning_mode, self.prediction_active,
+           self.pattern_established, self.pattern_type)
+    if getattr(self, '_governor_key', None) == key:
+        return
+    self._governor_key = key
+    target = None
+    if not self.learning_mode and self.prediction_active and self.pattern_established:
+        try:
+            next_onset = self.predict_next_gray()
+        except Exception:
+            next_onset = None
+        if next_onset:
+            if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
+                interval = min(float(self.alt_interval_a), float(self.alt_interval_b))
+            elif self.pattern_type == "cycle" and self.cycle_intervals:
+                interval = min(self.cycle_intervals)
+            elif self.pattern_type == "markov" and self.markov_model is not None:
+                interval = float(self.markov_model.centers[0])
+            else:
+                interval = float(self.average_interval or 0.0)
+            window = max(float(getattr(self, 'governor_burst_ms', 40)) / 1000.0,
+                         float(getattr(self, 'governor_burst_frac', 0.15)) * interval)
+            target = (float(next_onset), window)
+    self.governor_target = target
+
+
+def governor_delay(self):
+    """Seconds the capture loop may idle before its next grab.
+
+    Full rate until the main thread has published a target (see
+    publish_governor_target). Frames far from the next expected onset are
+    then taken at `governor_idle_fps`; inside the burst window before it
+    the loop captures flat out. Never idles past the start of the window.
+    Safe to call from the capture thread: it reads only the published
+    `self.governor_target` tuple and the governor knobs.
+    """
+    if not getattr(self, 'governor_enabled', True):
+        return 0.0
+    target = getattr(self, 'governor_target', None)
+    if target is None:
+        self.governor_state = "FULL"
+        return 0.0
+    next_onset, window = target
+    until_window = (next_onset - window) - time.perf_counter()
+    if until_window <= 0.0:
+        self.governor_state = "BURST"
+        return 0.0
+    self.governor_state = "IDLE"
+    idle_period = 1.0 / max(1.0, float(getattr(self, 'governor_idle_fps', 60)))
+    return min(idle_period, until_window)
+
+
+def _roi_monitor(self, area):
+    """Return the mss monitor dict covering `area` in absolute screen coordinates.
+
+    `area` is (x1, y1, x2, y2) relative to `self.monitor`, as produced by
+    select_area. Bounds are clamped to the detector region the same way
+    slicing the full frame would clamp them. Returns None for an empty ROI.
+    The dict is cached per area so the hot loop does not rebuild it.
+    """
+    if getattr(self, '_roi_monitor_area', None) == area:
+        return self._roi_monitor_cache
+    x1, y1, x2, y2 = (int(v) for v in area)
+    width = int(self.monitor["width"])
+    height = int(self.monitor["height"])
+    x1 = max(0, min(width, x1))
+    x2 = max(0, min(width, x2))
+    y1 = max(0, min(height, y1))
+    y2 = max(0, min(height, y2))
+    mon = None
+    if x2 > x1 and y2 > y1:
+        mon = {
+            "top": int(self.monitor["top"]) + y1,
+            "left": int(self.monitor["left"]) + x1,
+            "width": x2 - x1,
+            "height": y2 - y1,
+        }
+    self._roi_monitor_area = area
+    self._roi_monitor_cache = mon
+    return mon
+
+
+def _grab_roi(self, sct, area):
+    """Grab `area` with the given mss instance; return (frame, capture_ts_ns).
+
+    The timestamp is the midpoint of the grab on the perf_counter_ns clock.
+    """
+    mon = _roi_monitor(self, area)
+    if mon is None:
+        return np.empty((0, 0, 3), dtype=np.uint8), time.perf_counter_ns()
+    t0 = time.perf_counter_ns()
+    img = sct.grab(mon)
+    t1 = time.perf_counter_ns()
+    if getattr(self, 'capture_bgra', True):
+        frame = np.frombuffer(img.raw, dtype=np.uint8).reshape(img.height, img.width, 4)
+    else:
+        frame = np.frombuffer(img.rgb, dtype=np.uint8).reshape(img.height, img.width, 3)
+    return frame, (t0 + t1) // 2
+
+
+def roi_capture(self, area):
+    """Grab only the ROI bounding box instead of the whole detector region.
+
+    Used while monitoring so each frame copies just the pixels that get
+    classified. With `capture_bgra` enabled the frame is a zero-copy BGRA
+    view over mss's raw buffer (no per-frame RGB conversion); otherwise it
+    is RGB like ultra_fast_capture. When `self.frame_source` is set (e.g. a
+    ReplayFrameSource) frames come from it instead of the screen. Updates
+    the same FPS counters and stores the capture instant in
+    `self.frame_ts_ns`.
+    """
+    source = getattr(self, 'frame_source', None)
+    if source is not None:
+        frame, ts_ns = source.grab(area)
+        if frame is None:
+            # Source exhausted: end the monitoring session
+            self.monitoring = False
+            return np.empty((0, 0, 3), dtype=np.uint8)
+    else:
+        frame, ts_ns = _grab_roi(self, self.sct, area)
+    if frame.size == 0:
+        return frame
+    self.frame_ts_ns = ts_ns
+
+    _update_fps(self)
 
     return frame
 
+
+class FrameRing:
+    """Fixed-size preallocated ring of frames, each slot tagged with its
+    monotonic capture timestamp (perf_counter_ns) and sequence number.
+
+    A single writer publishes into the slot after the newest one; readers
+    copy the newest slot out and re-check its sequence number afterwards,
+    so a slot overwritten mid-copy is detected and read again.
+    """
+
+    def __init__(self, shape, size=8):
+        self.size = max(3, int(size))
+        self.frames = np.empty((self.size,) + tuple(shape), dtype=np.uint8)
+        self.ts_ns = np.zeros(self.size, dtype=np.int64)
+        self.seqs = np.zeros(self.size, dtype=np.int64)
+        self.seq = 0
+        self.cond = threading.Condition()
+
+    def publish(self, frame, ts_ns):
+        seq = self.seq + 1
+        i = seq % self.size
+        self.seqs[i] = -1  # mark the slot as being rewritten
+        np.copyto(self.frames[i], frame)
+        self.ts_ns[i] = ts_ns
+        self.seqs[i] = seq
+        with self.cond:
+            self.seq = seq
+            self.cond.notify_all()
+
+    def read_latest(self, after_seq, out, timeout=0.1):
+        """Copy the newest frame newer than `after_seq` into `out`.
+
+        Returns (seq, ts_ns), or None if nothing new arrived within `timeout`.
+        """
+        with self.cond:
+            if self.seq <= after_seq:
+                self.cond.wait(timeout)
+            seq = self.seq
+        if seq <= after_seq:
+            return None
+        while True:
+            i = seq % self.size
+            np.copyto(out, self.frames[i])
+            ts_ns = int(self.ts_ns[i])
+            if int(self.seqs[i]) == seq:
+                return seq, ts_ns
+            seq = self.seq
+
+
+def _capture_loop(self, area, stop):
+    """Capture thread body: grab `area` flat out into a FrameRing."""
+    import mss
+    # mss handles are bound to the thread that created them
+    with mss.mss() as sct:
+        while not stop.is_set():
+            idle = governor_delay(self)
+            if idle > 0.0:
+                stop.wait(idle)
+                continue
+            try:
+                frame, ts_ns = _grab_roi(self, sct, area)
+            except Exception:
+                time.sleep(0.01)
+                continue
+            if frame.size == 0:
+                time.sleep(0.01)
+                continue
+            ring = self._capture_ring
+            if ring is None or ring.frames.shape[1:] != frame.shape:
+                ring = FrameRing(frame.shape, getattr(self, 'capture_ring_size', 8))
+                self._capture_ring = ring
+            ring.publish(frame, ts_ns)
+            _update_fps(self)
+
+
+def start_capture_thread(self, area):
+    """Start (or restart) the dedicated capture thread for `area`."""
+    stop_capture_thread(self)
+    self._capture_ring = None
+    self._capture_out = None
+    self._capture_last_seq = 0
+    self.frames_consumed = 0
+    self.frames_dropped = 0
+    self._capture_stop = threading.Event()
+    t = threading.Thread(target=_capture_loop, args=(self, area, self._capture_stop), daemon=True)
+    self._capture_thread = t
+    t.start()
+
+
+def stop_capture_thread(self):
+    """Stop the capture thread if running."""
+    t = getattr(self, '_capture_thread', None)
+    if t is None:
+        return
+    self._capture_stop.set()
+    t.join(timeout=1.0)
+    self._capture_thread = None
+
+
+def latest_frame(self, timeout=0.1):
+    """Return the newest captured ROI frame, or None if none arrived in time.
+
+    Frames published since the previous call but never consumed are added
+    to `self.frames_dropped`. The frame's capture instant is stored in
+    `self.frame_ts_ns` and its sequence number in `self.frame_seq`.
+    """
+    ring = getattr(self, '_capture_ring', None)
+    if ring is None:
+        time.sleep(min(timeout, 0.005))
+        return None
+    out = self._capture_out
+    if out is None or out.shape != ring.frames.shape[1:]:
+        out = np.empty(ring.frames.shape[1:], dtype=np.uint8)
+        self._capture_out = out
+        self._capture_last_seq = 0
+    got = ring.read_latest(self._capture_last_seq, out, timeout)
+    if got is None:
+        return None
+    seq, ts_ns = got
+    if self._capture_last_seq:
+        self.frames_dropped += max(0, seq - self._capture_last_seq - 1)
+    self.frames_consumed += 1
+    self._capture_last_seq = seq
+    self.frame_seq = seq
+    self.frame_ts_ns = ts_ns
+    return out
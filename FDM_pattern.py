@@ -1,35 +1,242 @@
 import time
 import statistics
+import threading
+from collections import namedtuple
+
+from FDM_stats import (Cusum, IntervalMarkov, IntervalStats, OnsetTracker, RingBuffer,
+                       cluster_durations, detect_cycle)
+
+
+# Tuning knobs read on the per-event pattern and press paths. Their values
+# live on the detector (set in PredictiveTimingDetector.__init__);
+# pattern_config() snapshots them.
+_CONFIG_KNOBS = (
+    'min_samples', 'pattern_history_n', 'min_interval_abs',
+    'min_interval_fraction_of_avg', 'pipeline_delay_alpha', 'ab_window_n',
+    'ab_trim_frac', 'ab_min_pairs', 'ab_lead_ms', 'ab_pre_guard_ms',
+    'ab_classify_margin_frac', 'ab_classify_margin_ms_min', 'ab_target_after_ms',
+    'ab_phase_alpha', 'ab_phase_min', 'ab_phase_max', 'ab_event_driven_press',
+    'ab_race_early_ms', 'ab_pre_spin_ms', 'ab_spin_wait_ms', 'cycle_detection',
+    'cycle_max_k', 'cycle_window_n', 'cycle_min_acf', 'cycle_max_cv',
+    'cycle_min_cycles', 'cycle_min_explained', 'markov_enabled', 'markov_window_n',
+    'markov_min_samples', 'markov_max_classes', 'markov_max_order',
+    'markov_min_accuracy', 'markov_min_confidence', 'tracker_enabled',
+    'tracker_min_updates', 'tracker_meas_ms', 'tracker_phase_ms', 'tracker_period_ms',
+    'tracker_drift_ms', 'tracker_gate_sigmas', 'tracker_window_sigmas',
+    'tracker_window_min_ms', 'tracker_window_max_ms', 'change_detection',
+    'change_sigma_frac', 'change_sigma_min_ms', 'change_drift', 'change_threshold',
+    'predictor_mode', 'predictor_score_alpha', 'predictor_min_scored',
+    'predictor_blend_ratio', 'target_horizon_cycles', 'fast_gap_use_min',
+    'fast_gap_threshold', 'fast_min_window_n', 'press_cooldown_s',
+    'compensate_pipeline_delay', 'pipeline_delay_max_s', 'stop_after_press', 'debug_ab',
+)
+
+PatternConfig = namedtuple('PatternConfig', _CONFIG_KNOBS)
+
+# A projected press target: the time to aim at, the earliest allowed press,
+# the onset's uncertainty window (None if unknown) and the targeted interval
+PressTarget = namedtuple('PressTarget', 'time not_before window interval')
+
+
+def pattern_config(self):
+    """Snapshot the current tuning knobs into an immutable PatternConfig."""
+    return PatternConfig(*(getattr(self, name) for name in _CONFIG_KNOBS))
+
+
+class PatternState:
+    """Bounded per-area onset history plus the knob snapshot it was built with.
+
+    Timestamps and intervals live in fixed-capacity RingBuffers (at least
+    `pattern_history_n` values, and never fewer than the statistics windows
+    need), so memory stays flat over long sessions. `stats` are the rolling
+    interval statistics, updated as intervals are added. `tracker` is the
+    OnsetTracker following period and phase once a pattern is established,
+    and `change` the Cusum watching its residuals for a pattern change.
+    `pending` holds each registered predictor's guess for the next interval
+    and `scores` its [smoothed absolute error, scored count] (see PREDICTORS).
+    """
+
+    __slots__ = ('config', 'timestamps', 'intervals', 'stats', 'tracker', 'change',
+                 'pending', 'scores')
+
+    def __init__(self, config):
+        self.config = config
+        capacity = max(int(config.pattern_history_n), 4 * int(config.ab_window_n),
+                       int(config.fast_min_window_n), int(config.cycle_window_n),
+                       int(config.markov_window_n),
+                       int(config.min_samples) + 1)
+        self.timestamps = RingBuffer(capacity)
+        self.intervals = RingBuffer(capacity)
+        self.stats = IntervalStats(config.ab_window_n, config.ab_trim_frac)
+        self.tracker = None
+        self.change = Cusum(config.change_drift, config.change_threshold)
+        self.pending = {}
+        self.scores = {}
+
+    def add_onset(self, ts, interval=None):
+        """Record an onset at `ts` and, if given, the interval that ended there."""
+        self.timestamps.append(ts)
+        if interval is not None:
+            self.intervals.append(interval)
+            if self.stats.count == self.intervals.total - 1:
+                self.stats.push(interval)
+            if self.tracker is not None:
+                self.tracker.update(ts, self.intervals.total - 1)
+
+    def tracked(self):
+        """Return the tracker if it is enabled and has settled, else None."""
+        tracker = self.tracker
+        if (tracker is None or not self.config.tracker_enabled
+                or tracker.updates < int(self.config.tracker_min_updates)):
+            return None
+        return tracker
+
+
+def refresh_pattern_config(self):
+    """Re-read the tuning knobs into the current PatternState's snapshot."""
+    self.pattern.config = pattern_config(self)
+
+
+def _frame_time(self):
+    """Capture instant of the current frame in seconds on the perf_counter clock.
+
+    Falls back to "now" when no frame timestamp is available.
+    """
+    ts_ns = getattr(self, 'frame_ts_ns', None)
+    if ts_ns is None:
+        return time.perf_counter()
+    return ts_ns * 1e-9
+
+
+def _note_pipeline_delay(self, capture_ts):
+    """Update the smoothed capture-to-decision delay (`pipeline_delay_s`)."""
+    delay = time.perf_counter() - capture_ts
+    if delay < 0.0:
+        return
+    prev = self.pipeline_delay_s
+    alpha = float(self.pattern.config.pipeline_delay_alpha)
+    self.pipeline_delay_s = delay if prev is None else (1 - alpha) * float(prev) + alpha * delay
+
+
+def _known_durations(self):
+    """Interval lengths the established pattern produces, or None.
+
+    A settled tracker scales the pattern's phases by its current period,
+    so slow drift it is following does not count as a change.
+    """
+    if not self.pattern_established:
+        return None
+    if self.pattern_type == "markov" and self.markov_model is not None:
+        return self.markov_model.centers.tolist()
+    tracker = self.pattern.tracked()
+    if tracker is not None:
+        return [tracker.period * r for r in tracker.ratios]
+    if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
+        return [self.alt_interval_a, self.alt_interval_b]
+    if self.pattern_type == "cycle" and self.cycle_intervals:
+        return list(self.cycle_intervals)
+    return [self.average_interval] if self.average_interval else None
+
+
+def _add_interval(self, ts, interval):
+    """Record the onset at `ts` ending `interval`, watching for a pattern change.
+
+    While a pattern is established, each interval's residual against the
+    nearest duration the pattern produces (so an A/B phase slip or an
+    unlikely Markov class is not a change, a speed change is), in units of
+    max(change_sigma_frac * expected, change_sigma_min_ms), feeds the
+    pattern's Cusum. When it fires the learned pattern is dropped and
+    learning restarts from the onsets after the estimated change point;
+    scheduling pauses until it re-establishes.
+    """
+    state = self.pattern
+    cfg = state.config
+    _score_predictors(state, interval)
+    durations = _known_durations(self) if cfg.change_detection else None
+    state.add_onset(ts, interval)
+    if not durations:
+        return
+    expected = min(durations, key=lambda d: abs(d - interval))
+    if expected <= 0.0:
+        return
+    scale = max(float(cfg.change_sigma_frac) * expected, float(cfg.change_sigma_min_ms) / 1000.0)
+    index = state.intervals.total - 1
+    fired = state.change.update((interval - expected) / scale, index)
+    if fired is None:
+        return
+    start, sign = fired
+    timestamps = state.timestamps
+    # Onset number `start` opens interval number `start`
+    first = max(0, start - (timestamps.total - len(timestamps)))
+    keep = timestamps[first:]
+    try:
+        print(f"Pattern change detected (intervals {'longer' if sign > 0 else 'shorter'}"
+              f" than {expected:.3f}s); re-learning from {len(keep) - 1} new intervals")
+    except Exception:
+        pass
+    relearn_pattern(self, keep)
+
+
+def relearn_pattern(self, timestamps=()):
+    """Drop the learned pattern and learn again from `timestamps` only.
+
+    Unlike reset_pattern_learning, modes, counters and press gating are
+    kept, so prediction resumes on its own once the new pattern is
+    established.
+    """
+    state = PatternState(self.pattern.config)
+    prev = None
+    for ts in timestamps:
+        state.add_onset(ts, None if prev is None else ts - prev)
+        prev = ts
+    self.pattern = state
+    _forget_pattern(self)
+    try:
+        self.invalidate_predictions()
+    except Exception:
+        pass
 
 
 def record_gray_appearance(self):
     """Record timestamp when gray appears (simple)."""
-    current_time = time.time()
-    self.gray_timestamps.append(current_time)
+    current_time = _frame_time(self)
+    state = self.pattern
+    if not state.timestamps:
+        state.add_onset(current_time)
+        return
+    interval = current_time - state.timestamps[-1]
+    print(f"Gray interval: {interval:.3f}s")
+    _add_interval(self, current_time, interval)
+    state = self.pattern
 
-    # Calculate intervals if we have enough data
-    if len(self.gray_timestamps) >= 2:
-        interval = current_time - self.gray_timestamps[-2]
-        self.intervals.append(interval)
-        print(f"Gray interval: {interval:.3f}s")
+    # Establish pattern with enough samples
+    if len(state.intervals) >= state.config.min_samples:
+        calculate_pattern_v2(self)
+        _sync_tracker(self)
+    _refresh_predictions(self)
 
-        # Establish pattern with enough samples
-        if len(self.intervals) >= self.min_samples:
-            calculate_pattern_v2(self)
 
+def record_gray_appearance_safe(self, ts=None):
+    """Record timestamp when gray appears, filtering spurious ultra-short intervals.
 
-def record_gray_appearance_safe(self):
-    """Record timestamp when gray appears, filtering spurious ultra-short intervals."""
-    now = time.time()
-    if self.gray_timestamps:
-        last = self.gray_timestamps[-1]
+    The onset is stamped at `ts` (the sub-frame estimate from
+    estimate_onset_time) or else the current frame's capture instant, rather
+    than when this code runs, so grab and classification time do not leak
+    into the intervals.
+    """
+    frame_ts = _frame_time(self)
+    now = frame_ts if ts is None else ts
+    _note_pipeline_delay(self, frame_ts)
+    state = self.pattern
+    cfg = state.config
+    if state.timestamps:
+        last = state.timestamps[-1]
         interval = now - last
-        too_short = interval < getattr(self, 'min_interval_abs', 0.08)
+        too_short = interval < cfg.min_interval_abs
         too_small_vs_avg = False
         if self.average_interval:
             try:
-                frac = getattr(self, 'min_interval_fraction_of_avg', 0.30)
-                too_small_vs_avg = interval < (self.average_interval * frac)
+                too_small_vs_avg = interval < (self.average_interval * cfg.min_interval_fraction_of_avg)
             except Exception:
                 too_small_vs_avg = False
         if too_short or too_small_vs_avg:
@@ -38,14 +245,16 @@ def record_gray_appearance_safe(self):
             except Exception:
                 pass
             return
-        self.gray_timestamps.append(now)
-        self.intervals.append(interval)
         print(f"Gray interval: {interval:.3f}s")
+        _add_interval(self, now, interval)
+        state = self.pattern
     else:
-        self.gray_timestamps.append(now)
+        state.add_onset(now)
 
-    if len(self.intervals) >= self.min_samples:
+    if len(state.intervals) >= cfg.min_samples:
         calculate_pattern_v2(self)
+        _sync_tracker(self)
+    _refresh_predictions(self)
 
 
 def calculate_pattern(self):
@@ -73,22 +282,65 @@ def calculate_pattern(self):
         print("   Pattern inconsistent, need more samples...")
 
 
+def _interval_stats(self):
+    """Return the rolling IntervalStats of the current PatternState.
+
+    PatternState.add_onset keeps them in step with each new interval, so an
+    onset costs O(log n) in the window size. They are rebuilt from the
+    retained intervals if they fell out of step (intervals appended
+    directly) or the window knobs in the config snapshot changed.
+    """
+    state = self.pattern
+    stats = state.stats
+    cfg = state.config
+    intervals = state.intervals
+    if (stats.count != intervals.total or stats.window_n != max(2, int(cfg.ab_window_n))
+            or stats.trim_frac != float(cfg.ab_trim_frac)):
+        stats = IntervalStats.from_intervals(intervals[:], cfg.ab_window_n, cfg.ab_trim_frac,
+                                             start=intervals.total - len(intervals))
+        state.stats = stats
+    return stats
+
+
+def _detect_cycle(self):
+    """Run detect_cycle over the last `cycle_window_n` retained intervals."""
+    cfg = self.pattern.config
+    intervals = self.pattern.intervals
+    n = min(len(intervals), max(4, int(cfg.cycle_window_n)))
+    return detect_cycle(intervals[-n:], cfg.cycle_max_k, start=intervals.total - n,
+                        min_acf=float(cfg.cycle_min_acf), max_cv=float(cfg.cycle_max_cv),
+                        min_cycles=int(cfg.cycle_min_cycles),
+                        min_explained=float(cfg.cycle_min_explained))
+
+
 def calculate_pattern_v2(self):
-    """Enhanced pattern detection supporting alternating intervals (1,2,1,2)."""
-    if len(self.intervals) < self.min_samples:
+    """Enhanced pattern detection supporting alternating intervals (1,2,1,2)
+    and longer repeating cycles (1,1,2 / 1,2,3 ...).
+
+    Statistics come from rolling windows of the last `ab_window_n` intervals
+    per A/B phase (trimmed by `ab_trim_frac`), updated incrementally. Cycles
+    of up to `cycle_max_k` intervals are found from the autocorrelation of
+    the last `cycle_window_n` intervals.
+    """
+    cfg = self.pattern.config
+    if len(self.intervals) < cfg.min_samples:
         return
 
     # Sticky single-interval refinement: once established, keep it and smooth updates
     if self.pattern_type == "single" and self.pattern_established and self.average_interval:
         last = self.intervals[-1] if self.intervals else None
-        if last is not None:
+        tracker = self.pattern.tracked()
+        if tracker is not None:
+            # The tracker's period already follows drift without EMA lag
+            self.average_interval = tracker.period
+        elif last is not None:
             low = 0.5 * self.average_interval
             high = 1.5 * self.average_interval
             if low <= last <= high:
                 alpha = 0.2
                 self.average_interval = (1 - alpha) * float(self.average_interval) + alpha * float(last)
         print("PATTERN ANALYSIS:")
-        print(f"   Samples: {len(self.intervals)}")
+        print(f"   Samples: {self.intervals.total}")
         print(f"   Average interval: {self.average_interval:.3f}s  (sticky)")
         # Compute effective single interval for fast-gap mode
         try:
@@ -102,76 +354,98 @@ def calculate_pattern_v2(self):
             print("Prediction auto-activated.")
         return
 
-    # General case
-    try:
-        std_all = statistics.stdev(self.intervals) if len(self.intervals) > 1 else 0.0
-        cv_overall = (std_all / statistics.mean(self.intervals)) * 100 if statistics.mean(self.intervals) > 0 else 100
-    except Exception:
-        cv_overall = 100
+    # General case, from the rolling windows (see _interval_stats)
+    stats = _interval_stats(self)
+    mean_all = stats.all.mean()
+    std_all = stats.all.stdev()
+    cv_overall = (std_all / mean_all) * 100 if mean_all and mean_all > 0 else 100
 
     # Default to single interval
+    was_markov = self.pattern_established and self.pattern_type == "markov"
     self.pattern_type = "single"
-    self.average_interval = statistics.mean(self.intervals)
+    self.average_interval = mean_all
 
     # Check for alternating pattern using even/odd intervals
-    even = [self.intervals[i] for i in range(0, len(self.intervals)) if i % 2 == 0]
-    odd = [self.intervals[i] for i in range(0, len(self.intervals)) if i % 2 == 1]
+    even = stats.even
+    odd = stats.odd
     alt_detected = False
     if len(even) >= 2 and len(odd) >= 2:
-        def tmean(vals):
-            if not vals:
-                return None
-            k = max(1, int(len(vals) * 0.2))
-            sel = sorted(vals)
-            if len(sel) > 2 * k:
-                sel = sel[k:-k]
-            return statistics.mean(sel) if sel else None
-        mean_even = tmean(even) or statistics.mean(even)
-        mean_odd = tmean(odd) or statistics.mean(odd)
-        std_even = statistics.stdev(even) if len(even) > 1 else 0.0
-        std_odd = statistics.stdev(odd) if len(odd) > 1 else 0.0
+        mean_even = even.trimmed_mean(stats.trim_frac) or even.mean()
+        mean_odd = odd.trimmed_mean(stats.trim_frac) or odd.mean()
+        std_even = even.stdev()
+        std_odd = odd.stdev()
         cv_even = (std_even / mean_even) * 100 if mean_even > 0 else 100
         cv_odd = (std_odd / mean_odd) * 100 if mean_odd > 0 else 100
         distinct_pct = abs(mean_even - mean_odd) / max(mean_even, mean_odd) * 100 if max(mean_even, mean_odd) > 0 else 0
         # Relaxed thresholds + strong distinctness to converge on A/B
         if ((len(even) >= 2 and len(odd) >= 2 and cv_even < 22 and cv_odd < 22 and distinct_pct > 15) or
-            (len(self.intervals) >= 4 and distinct_pct > 30 and max(cv_even, cv_odd) < 30)):
+            (len(stats.all) >= 4 and distinct_pct > 30 and max(cv_even, cv_odd) < 30)):
             alt_detected = True
             self.pattern_type = "alternating"
             self.alt_interval_a = mean_even
             self.alt_interval_b = mean_odd
 
+    # Period-k cycles via autocorrelation; k == 2 is an A/B alternation,
+    # kept on the A/B path (phase means are aligned to even/odd indices)
+    cycle = None
+    if not alt_detected and cv_overall >= 10 and cfg.cycle_detection:
+        cycle = _detect_cycle(self)
+        if cycle is not None:
+            k, means, _ = cycle
+            if k == 2:
+                alt_detected = True
+                self.pattern_type = "alternating"
+                self.alt_interval_a, self.alt_interval_b = means
+            else:
+                self.pattern_type = "cycle"
+                self.cycle_intervals = means
+
+    # Irregular but structured sequences: Markov chain over duration classes
+    # (a plain two-class alternation is left to the A/B fallback below)
+    markov = None
+    if not alt_detected and cycle is None and cv_overall >= 10 and cfg.markov_enabled:
+        markov = _fit_markov(self, keep=was_markov)
+        if markov is not None:
+            self.pattern_type = "markov"
+            self.markov_model = markov
+        else:
+            markov = None
+
     # Fallback A/B detection via threshold + flip-rate if not detected yet
-    if not alt_detected and len(self.intervals) >= 6:
-        vals = list(self.intervals)
-        try:
-            thr = statistics.median(vals)
-        except Exception:
-            thr = sum(vals) / len(vals)
-        labels = [0 if v <= thr else 1 for v in vals]
-        flips = sum(1 for i in range(1, len(labels)) if labels[i] != labels[i-1])
-        flip_rate = flips / (len(labels) - 1)
-        low = [v for v in vals if v <= thr]
-        high = [v for v in vals if v > thr]
+    if not alt_detected and cycle is None and markov is None and len(stats.all) >= 6:
+        thr = stats.all.median()
+        flips = 0
+        prev = None
+        for v in stats.all.values:
+            label = v > thr
+            if prev is not None and label != prev:
+                flips += 1
+            prev = label
+        flip_rate = flips / (len(stats.all) - 1)
+        low, high = stats.all.split_at(thr)
         if low and high:
-            mean_low = statistics.mean(low)
-            mean_high = statistics.mean(high)
+            mean_low = statistics.fmean(low)
+            mean_high = statistics.fmean(high)
             std_low = statistics.stdev(low) if len(low) > 1 else 0.0
             std_high = statistics.stdev(high) if len(high) > 1 else 0.0
             cv_low = (std_low / mean_low) * 100 if mean_low > 0 else 100
             cv_high = (std_high / mean_high) * 100 if mean_high > 0 else 100
             distinct2 = abs(mean_high - mean_low) / max(mean_high, mean_low) * 100 if max(mean_high, mean_low) > 0 else 0
-            # Require clear alternation and bimodality
-            if flip_rate > 0.65 and distinct2 > 25 and max(cv_low, cv_high) < 28 and min(len(low), len(high)) >= 3:
+            # Require clear alternation and bimodality, lined up with the
+            # interval parity the A/B scheduling relies on
+            parity_split = (abs(even.mean() - odd.mean()) >= 0.5 * (mean_high - mean_low)
+                            if len(even) and len(odd) else False)
+            if (flip_rate > 0.65 and distinct2 > 25 and max(cv_low, cv_high) < 28
+                    and min(len(low), len(high)) >= 3 and parity_split):
                 alt_detected = True
                 self.pattern_type = "alternating"
                 # Keep alt A/B aligned to even/odd index means for parity-based scheduling
-                self.alt_interval_a = statistics.mean(even) if even else mean_low
-                self.alt_interval_b = statistics.mean(odd) if odd else mean_high
+                self.alt_interval_a = even.mean() if len(even) else mean_low
+                self.alt_interval_b = odd.mean() if len(odd) else mean_high
 
     # Logging (simplified)
     print("PATTERN ANALYSIS:")
-    print(f"   Samples: {len(self.intervals)}")
+    print(f"   Samples: {self.intervals.total}")
     if alt_detected or self.pattern_type == "alternating":
         print(f"   Alternating means: A={self.alt_interval_a:.3f}s, B={self.alt_interval_b:.3f}s")
         self.pattern_established = True
@@ -179,6 +453,24 @@ def calculate_pattern_v2(self):
             self.learning_mode = False
             self.prediction_active = True
             print("Prediction auto-activated.")
+    elif self.pattern_type == "cycle":
+        print(f"   Cycle of {len(self.cycle_intervals)}: "
+              + "/".join(f"{v:.3f}" for v in self.cycle_intervals) + "s")
+        self.pattern_established = True
+        if self.auto_predict and not self.prediction_active:
+            self.learning_mode = False
+            self.prediction_active = True
+            print("Prediction auto-activated.")
+    elif self.pattern_type == "markov":
+        markov = self.markov_model
+        print(f"   Markov (order {markov.order}) over "
+              + "/".join(f"{v:.3f}" for v in markov.centers)
+              + f"s, {markov.accuracy * 100:.0f}% predictable")
+        self.pattern_established = True
+        if self.auto_predict and not self.prediction_active:
+            self.learning_mode = False
+            self.prediction_active = True
+            print("Prediction auto-activated.")
     else:
         print(f"   Average interval: {self.average_interval:.3f}s  (CV {cv_overall:.1f}%)")
         if cv_overall < 10:
@@ -194,9 +486,277 @@ def calculate_pattern_v2(self):
                 self.prediction_active = True
                 print("Prediction auto-activated.")
         else:
+            # Whatever was established no longer fits: stop predicting on it
+            # (onsets keep being recorded) rather than fall back to a
+            # sticky single interval
+            self.pattern_established = False
             print("   Pattern inconsistent, need more samples...")
 
 
+def _fit_markov(self, keep=False):
+    """Fit an IntervalMarkov over the last `markov_window_n` intervals.
+
+    The intervals must fall into at least two duration classes, and the
+    fitted chain must predict the next class at least `markov_min_accuracy`
+    of the time (0.1 less to `keep` an established Markov pattern); the
+    lowest order (up to `markov_max_order`) that does is used. A first-order
+    two-class swap is an A/B pattern: a clean one (95%) returns None, a
+    weak one moves on to the next order.
+    """
+    cfg = self.pattern.config
+    min_accuracy = float(cfg.markov_min_accuracy) - (0.1 if keep else 0.0)
+    intervals = self.pattern.intervals
+    n = min(len(intervals), int(cfg.markov_window_n))
+    if n < int(cfg.markov_min_samples):
+        return None
+    clusters = cluster_durations(intervals[-n:], int(cfg.markov_max_classes))
+    if clusters is None or clusters[0].size < 2:
+        return None
+    for order in range(1, max(1, int(cfg.markov_max_order)) + 1):
+        model = IntervalMarkov(clusters[0], clusters[1], order=order)
+        if model.accuracy < min_accuracy:
+            continue
+        if _is_alternation(model):
+            if model.accuracy >= 0.95:
+                return None
+            continue
+        return model
+    return None
+
+
+def _is_alternation(markov):
+    """True if `markov` is a first-order chain of two classes that swap (A/B)."""
+    if markov.centers.size != 2 or markov.order != 1:
+        return False
+    first = markov.first
+    return bool(first[0, 1] > first[0, 0] and first[1, 0] > first[1, 1])
+
+
+def _markov_next(self):
+    """Most likely next interval and its probability under the Markov pattern."""
+    markov = self.markov_model
+    if markov is None or not self.intervals:
+        return None
+    return markov.predict(self.intervals[-markov.order:])
+
+
+def _sync_tracker(self):
+    """Start the onset tracker on the learned pattern, or keep it in step.
+
+    The tracker is (re)seeded at the last onset when a pattern is first
+    established, its shape changes (pattern type, cycle length or phase
+    ratios off by more than 10%) or it rejected the last onset; otherwise
+    only the phase ratios are refreshed, keeping the tracked period, phase
+    and drift.
+    """
+    state = self.pattern
+    cfg = state.config
+    if not cfg.tracker_enabled or not self.pattern_established or not state.timestamps:
+        return
+    if self.pattern_type == "markov":
+        # No fixed phase sequence to track
+        state.tracker = None
+        return
+    if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
+        means = (float(self.alt_interval_a), float(self.alt_interval_b))
+    elif self.pattern_type == "cycle" and self.cycle_intervals:
+        means = tuple(float(v) for v in self.cycle_intervals)
+    elif self.average_interval:
+        means = (float(self.average_interval),)
+    else:
+        return
+    base = sum(means) / len(means)
+    if base <= 0.0:
+        return
+    ratios = tuple(m / base for m in means)
+    tracker = state.tracker
+    # updates == 0 here means the last onset was rejected: restart from the
+    # learned pattern rather than keep the old period
+    if (tracker is not None and tracker.updates and len(tracker.ratios) == len(ratios)
+            and max(abs(a - b) for a, b in zip(tracker.ratios, ratios)) < 0.1):
+        tracker.ratios = ratios
+        return
+    state.tracker = OnsetTracker(state.timestamps[-1], base, ratios,
+                                 meas_s=float(cfg.tracker_meas_ms) / 1000.0,
+                                 phase_s=float(cfg.tracker_phase_ms) / 1000.0,
+                                 period_s=float(cfg.tracker_period_ms) / 1000.0,
+                                 drift_s=float(cfg.tracker_drift_ms) / 1000.0,
+                                 gate_sigmas=float(cfg.tracker_gate_sigmas))
+
+
+def _tracked_onset(self):
+    """Tracker prediction for the next onset as (time, window), or None.
+
+    `window` is `tracker_window_sigmas` standard deviations, clamped to
+    [tracker_window_min_ms, tracker_window_max_ms]; the scheduler sizes its
+    early guard and GRAY spin-wait from it.
+    """
+    tracker = self.pattern.tracked()
+    if tracker is None:
+        return None
+    cfg = self.pattern.config
+    t, sigma = tracker.predict(self.intervals.total)
+    window = float(cfg.tracker_window_sigmas) * sigma
+    window = max(float(cfg.tracker_window_min_ms) / 1000.0,
+                 min(float(cfg.tracker_window_max_ms) / 1000.0, window))
+    return t, window
+
+
+# Next-interval predictors run side by side on every onset. Each takes the
+# detector and returns its guess for the next interval in seconds, or None
+# when it has nothing to say; _refresh_predictions stores the guesses and
+# _score_predictors scores them against the interval that actually follows.
+PREDICTORS = {}
+
+
+def register_predictor(name, fn):
+    """Register `fn(detector) -> next interval or None` under `name`."""
+    PREDICTORS[name] = fn
+
+
+def _predict_single(self):
+    """Single interval: the pattern's average (EMA once sticky)."""
+    return self.average_interval
+
+
+def _predict_ab(self):
+    """Even/odd A/B: trimmed mean of the next interval's parity window."""
+    stats = _interval_stats(self)
+    window = stats.odd if self.intervals.total % 2 else stats.even
+    if len(window) < 2:
+        return None
+    return window.trimmed_mean(stats.trim_frac) or window.mean()
+
+
+def _predict_cycle(self):
+    """Period-k cycle: the learned mean of the next interval's phase."""
+    cycle = self.cycle_intervals
+    if not cycle:
+        return None
+    return float(cycle[self.intervals.total % len(cycle)])
+
+
+def _predict_markov(self):
+    """Markov chain: the most likely next duration class."""
+    nxt = _markov_next(self)
+    return None if nxt is None else float(nxt[0])
+
+
+def _predict_tracker(self):
+    """Onset tracker: filtered phase and period, relative to the last onset."""
+    tracker = self.pattern.tracked()
+    if tracker is None or not self.gray_timestamps:
+        return None
+    return tracker.predict(self.intervals.total)[0] - self.gray_timestamps[-1]
+
+
+register_predictor('single', _predict_single)
+register_predictor('ab', _predict_ab)
+register_predictor('cycle', _predict_cycle)
+register_predictor('markov', _predict_markov)
+register_predictor('tracker', _predict_tracker)
+
+
+def _score_predictors(state, interval):
+    """Score the pending guesses against the `interval` that just ended.
+
+    Each predictor keeps an exponentially weighted mean absolute error
+    (`predictor_score_alpha`), so scoring is O(1) per predictor and onset.
+    Absolute rather than squared error, so a model that names the right
+    duration class most of the time beats one always halfway between.
+    """
+    alpha = float(state.config.predictor_score_alpha)
+    scores = state.scores
+    for name, guess in state.pending.items():
+        if guess is None:
+            continue
+        err = abs(interval - guess)
+        score = scores.get(name)
+        if score is None:
+            scores[name] = [err, 1]
+        else:
+            score[0] += alpha * (err - score[0])
+            score[1] += 1
+
+
+def _refresh_predictions(self):
+    """Ask every registered predictor for the next interval."""
+    pending = {}
+    for name, fn in PREDICTORS.items():
+        try:
+            guess = fn(self)
+        except Exception:
+            guess = None
+        pending[name] = None if guess is None or guess <= 0.0 else float(guess)
+    self.pattern.pending = pending
+
+
+def _select_prediction(self):
+    """Backtested next interval as (interval, rms error, name), or None.
+
+    None until every predictor with a guess has been scored on at least
+    `predictor_min_scored` intervals of the current PatternState, so
+    after a relearn the one model that happened to start guessing first
+    (e.g. "single" on an A/B pattern) is not picked by default. "best"
+    picks the lowest smoothed error; "blend" weights the guesses of those
+    within `predictor_blend_ratio` of the best error by inverse squared
+    error. The rms is estimated as 1.25x the mean absolute error (exact for
+    Gaussian errors).
+    """
+    state = self.pattern
+    cfg = state.config
+    min_scored = int(cfg.predictor_min_scored)
+    candidates = []
+    for name, guess in state.pending.items():
+        if guess is None:
+            continue
+        score = state.scores.get(name)
+        if score is None or score[1] < min_scored:
+            return None
+        candidates.append((max(score[0], 1e-6), guess, name))
+    if not candidates:
+        return None
+    best = min(candidates)
+    if cfg.predictor_mode == 'blend':
+        limit = best[0] * float(cfg.predictor_blend_ratio)
+        blended = [c for c in candidates if c[0] <= limit]
+        if len(blended) > 1:
+            weights = [1.0 / (err * err) for err, _, _ in blended]
+            total = sum(weights)
+            interval = sum(w * guess for w, (_, guess, _) in zip(weights, blended)) / total
+            err = sum(w * err for w, (err, _, _) in zip(weights, blended)) / total
+            return interval, 1.25 * err, 'blend'
+    err, interval, name = best
+    return interval, 1.25 * err, name
+
+
+def _predicted_onset(self):
+    """Next onset as (time, window) for the press paths, or None.
+
+    With `predictor_mode` "best" or "blend" this is the registry's
+    backtested choice, its window `tracker_window_sigmas` times the rolling
+    RMS error (same clamps as the tracker's); until all guessing
+    predictors have been scored (see _select_prediction), or in "pattern"
+    mode, it is the settled tracker's prediction.
+    """
+    self.active_predictor = None
+    cfg = self.pattern.config
+    choice = None
+    if cfg.predictor_mode in ('best', 'blend') and self.gray_timestamps:
+        choice = _select_prediction(self)
+    if choice is None:
+        tracked = _tracked_onset(self)
+        if tracked is not None:
+            self.active_predictor = 'tracker'
+        return tracked
+    interval, rms, name = choice
+    self.active_predictor = name
+    window = float(cfg.tracker_window_sigmas) * rms
+    window = max(float(cfg.tracker_window_min_ms) / 1000.0,
+                 min(float(cfg.tracker_window_max_ms) / 1000.0, window))
+    return self.gray_timestamps[-1] + interval, window
+
+
 def _effective_single_interval(self):
     """Return the interval to use for single-pattern prediction.
 
@@ -204,16 +764,15 @@ def _effective_single_interval(self):
     use the minimum of the last `fast_min_window_n` intervals (above noise floor).
     Otherwise, use the average interval.
     """
-    avg = getattr(self, 'average_interval', None)
+    avg = self.average_interval
     if not avg:
         return None
-    use_min = bool(getattr(self, 'fast_gap_use_min', True))
-    thresh = float(getattr(self, 'fast_gap_threshold', 0.5))
-    if use_min and avg < thresh and self.intervals:
-        n = max(1, int(getattr(self, 'fast_min_window_n', 6)))
+    cfg = self.pattern.config
+    if cfg.fast_gap_use_min and avg < cfg.fast_gap_threshold and self.intervals:
+        n = max(1, int(cfg.fast_min_window_n))
         window = self.intervals[-n:] if len(self.intervals) >= n else self.intervals[:]
         # Filter by noise threshold
-        floor = float(getattr(self, 'min_interval_abs', 0.08))
+        floor = float(cfg.min_interval_abs)
         candidates = [x for x in window if x >= floor]
         if candidates:
             return min(candidates)
@@ -225,12 +784,21 @@ def predict_next_gray(self):
     if not self.pattern_established or not self.gray_timestamps:
         return None
 
+    tracked = _predicted_onset(self)
+    if tracked is not None:
+        return tracked[0]
     last_gray_time = self.gray_timestamps[-1]
     # Use alternating pattern if detected (default behavior: next interval)
     if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
-        next_index = len(self.intervals)  # zero-based index of the next interval
+        next_index = self.intervals.total  # zero-based index of the next interval
         next_delta = self.alt_interval_a if (next_index % 2 == 0) else self.alt_interval_b
         return last_gray_time + next_delta
+    elif self.pattern_type == "cycle" and self.cycle_intervals:
+        cycle = self.cycle_intervals
+        return last_gray_time + cycle[self.intervals.total % len(cycle)]
+    elif self.pattern_type == "markov" and self.markov_model is not None:
+        nxt = _markov_next(self)
+        return None if nxt is None else last_gray_time + nxt[0]
     else:
         return last_gray_time + self.average_interval
 
@@ -240,18 +808,27 @@ def predict_next_target_time(self):
 
     For alternating patterns, prefer the slower interval and ensure the
     press happens after the faster one has scanned if it comes first.
+    Once a backtested predictor (or the settled onset tracker) is available
+    its prediction is used, and `_target_window` (its uncertainty window)
+    sizes the scheduler's early guard and spin-wait; otherwise
+    `_target_window` is None. When the next A/B interval is the fast one
+    the slow onset of a later cycle is targeted (see project_targets).
     """
+    self._target_window = None
     if not self.pattern_established or not self.gray_timestamps:
         return None
     last_gray_time = self.gray_timestamps[-1]
+    cfg = self.pattern.config
+    n_intervals = self.intervals.total
+    tracked = _predicted_onset(self)
 
     if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
         # Gate: require enough pairs before scheduling in fast/unstable cases
-        min_pairs = int(getattr(self, 'ab_min_pairs', 5))
-        if len(self.intervals) < 2 * min_pairs:
-            if getattr(self, 'debug_ab', False):
+        min_pairs = int(cfg.ab_min_pairs)
+        if n_intervals < 2 * min_pairs:
+            if cfg.debug_ab:
                 try:
-                    print(f"AB debug: gating schedule until {min_pairs} pairs collected (have {len(self.intervals)//2})")
+                    print(f"AB debug: gating schedule until {min_pairs} pairs collected (have {n_intervals//2})")
                 except Exception:
                     pass
             return None
@@ -261,13 +838,13 @@ def predict_next_target_time(self):
         slow = max(a, b)
         # Schedule only when the last completed interval is the fast one.
         # Prefer value-based classification; fall back to parity if ambiguous.
-        last_idx = len(self.intervals) - 1
+        last_idx = n_intervals - 1
         if last_idx >= 0:
             last_iv = float(self.intervals[-1])
             # Value-based decision with margin (tunable)
             diff = abs(slow - fast)
-            frac = float(getattr(self, 'ab_classify_margin_frac', 0.10))
-            min_ms = float(getattr(self, 'ab_classify_margin_ms_min', 8)) / 1000.0
+            frac = float(cfg.ab_classify_margin_frac)
+            min_ms = float(cfg.ab_classify_margin_ms_min) / 1000.0
             margin = max(min_ms, frac * diff)  # e.g., 10% of separation or >=8ms
             by_value_fast = (abs(last_iv - fast) + 1e-6) < (abs(last_iv - slow) - margin)
             # Parity-based fallback
@@ -275,59 +852,184 @@ def predict_next_target_time(self):
             last_is_even = (last_idx % 2 == 0)
             by_parity_fast = (last_is_even == fast_is_even)
             last_was_fast = by_value_fast or (not by_value_fast and by_parity_fast)
-            if getattr(self, 'debug_ab', False):
+            if cfg.debug_ab:
                 try:
                     print(f"AB debug: classify last={last_iv:.3f}s as fast? value={by_value_fast} parity={by_parity_fast} (fast={fast:.3f}, slow={slow:.3f})")
                 except Exception:
                     pass
             if last_was_fast:
-                # Aggressive lead for fast pairs; adaptive: larger lead for smaller slow intervals
-                base_lead = max(0.0, float(getattr(self, 'ab_lead_ms', 22)) / 1000.0)
-                adaptive = 0.0
-                try:
-                    # Add up to +10ms extra lead when slow < 0.35s
-                    if slow < 0.35:
-                        adaptive = min(0.010, (0.35 - slow) * 0.08)
-                except Exception:
-                    adaptive = 0.0
-                phase = 0.001 * float(getattr(self, 'ab_phase_ms', 0))
-                lead_s = base_lead + adaptive + max(-0.050, min(0.050, phase))
-                slow_start = last_gray_time + slow
+                lead = _ab_lead(self, slow)
+                if (tracked is not None and abs(tracked[0] - last_gray_time - slow)
+                        < abs(tracked[0] - last_gray_time - fast)):
+                    # Predicted slow start; its window replaces the phase correction
+                    slow_start, pre_guard = tracked
+                    phase = 0.0
+                    self._target_window = pre_guard
+                else:
+                    slow_start = last_gray_time + slow
+                    pre_guard = max(0.0, float(cfg.ab_pre_guard_ms) / 1000.0)
+                    phase = 0.001 * float(self.ab_phase_ms or 0)
+                lead_s = lead + max(-0.050, min(0.050, phase))
                 # Store slow-start for accurate debug later
                 self._ab_slow_start_time = slow_start
-                predicted_time = last_gray_time + max(0.0, slow - lead_s)
-                pre_guard = max(0.0, float(getattr(self, 'ab_pre_guard_ms', 6)) / 1000.0)
+                predicted_time = max(last_gray_time, slow_start - lead_s)
                 # Allow early window before predicted_time; scheduler will clamp to +guard later
                 self._not_before_time = max(0.0, predicted_time - pre_guard)
                 self._last_target_interval = slow
                 self._ab_expect_slow_next = True
                 # Debug: confirm countdown starts at smaller value (fast)
-                if getattr(self, 'debug_ab', False):
+                if cfg.debug_ab:
                     try:
-                        now = time.time()
+                        now = time.perf_counter()
                         eta_ms = max(0.0, (predicted_time - now)) * 1000.0
                         slow_eta_ms = max(0.0, (slow_start - now)) * 1000.0
                         print(f"AB debug: countdown started at fast; ETA={eta_ms:.0f}ms (to slow-start {slow_eta_ms:.0f}ms) slow={slow:.3f}s lead={lead_s*1000:.0f}ms phase={phase*1000:.0f}ms")
                     except Exception:
                         pass
                 return predicted_time
+            # The next interval is the fast one: aim at the slow onset of a
+            # later cycle instead of skipping this event
+            return _use_target(self, project_targets(self))
         return None
+    elif self.pattern_type == "cycle" and self.cycle_intervals:
+        # Period-k cycle: the next interval's phase is its absolute index mod k
+        cycle = self.cycle_intervals
+        next_delta = float(cycle[n_intervals % len(cycle)])
+    elif self.pattern_type == "markov" and self.markov_model is not None:
+        # Only press when the next duration class is likely enough
+        nxt = _markov_next(self)
+        if nxt is None or nxt[1] < float(cfg.markov_min_confidence):
+            return None
+        next_delta = nxt[0]
     else:
         # Single pattern
         try:
-            eff = getattr(self, 'single_effective_interval', None)
+            eff = self.single_effective_interval
             next_delta = float(eff) if eff is not None else float(self.average_interval)
         except Exception:
             next_delta = float(self.average_interval)
-        self._last_target_interval = next_delta
-        return last_gray_time + next_delta
+    self._last_target_interval = next_delta
+    if tracked is not None:
+        # Never press earlier than the predicted onset's uncertainty window
+        predicted_time, window = tracked
+        self._target_window = window
+        self._not_before_time = predicted_time - window
+        return predicted_time
+    return last_gray_time + next_delta
 
 
-def reset_pattern_learning(self):
-    """Reset all learned patterns and gating state."""
-    # Core buffers
-    self.gray_timestamps = []
-    self.intervals = []
+def _ab_lead(self, slow):
+    """Press lead ahead of an A/B slow start: `ab_lead_ms`, plus up to 10ms
+    more when the slow interval is under 0.35s."""
+    base_lead = max(0.0, float(self.pattern.config.ab_lead_ms) / 1000.0)
+    adaptive = 0.0
+    try:
+        if slow < 0.35:
+            adaptive = min(0.010, (0.35 - slow) * 0.08)
+    except Exception:
+        adaptive = 0.0
+    return base_lead + adaptive
+
+
+def _cycle_length(self):
+    """Intervals per cycle of the established pattern."""
+    if self.pattern_type == "alternating":
+        return 2
+    if self.pattern_type == "cycle" and self.cycle_intervals:
+        return len(self.cycle_intervals)
+    return 1
+
+
+def _future_intervals(self, count):
+    """Lengths of the next `count` intervals the pattern produces.
+
+    A settled tracker scales its phase ratios by the tracked period. A
+    Markov pattern only projects its next interval, and only when it is
+    at least `markov_min_confidence` likely.
+    """
+    n = self.intervals.total
+    if self.pattern_type == "markov":
+        nxt = _markov_next(self)
+        if nxt is None or nxt[1] < float(self.pattern.config.markov_min_confidence):
+            return []
+        return [nxt[0]]
+    tracker = self.pattern.tracked()
+    if tracker is not None:
+        ratios = tracker.ratios
+        return [tracker.period * ratios[(n + j) % len(ratios)] for j in range(count)]
+    if self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b:
+        a = float(self.alt_interval_a)
+        b = float(self.alt_interval_b)
+        return [a if (n + j) % 2 == 0 else b for j in range(count)]
+    if self.pattern_type == "cycle" and self.cycle_intervals:
+        cycle = self.cycle_intervals
+        return [float(cycle[(n + j) % len(cycle)]) for j in range(count)]
+    interval = self.single_effective_interval or self.average_interval
+    return [float(interval)] * count if interval else []
+
+
+def project_targets(self):
+    """Press targets over the next `target_horizon_cycles` cycles, earliest first.
+
+    The first onset comes from _predicted_onset when available, the
+    following ones from the pattern's intervals, with the uncertainty
+    window growing as the square root of the steps ahead (capped at
+    `tracker_window_max_ms`). For A/B only the onsets ending a slow
+    interval are targets, led by the same lead as the next slow start.
+    The scheduler takes the earliest one it can still make; a horizon
+    below 1 disables the projection.
+    """
+    if not self.pattern_established or not self.gray_timestamps:
+        return []
+    cfg = self.pattern.config
+    horizon = int(cfg.target_horizon_cycles)
+    if horizon < 1:
+        return []
+    count = horizon * _cycle_length(self)
+    intervals = _future_intervals(self, count)
+    if not intervals:
+        return []
+    last_gray_time = self.gray_timestamps[-1]
+    first = _predicted_onset(self)
+    t, window = (last_gray_time + intervals[0], None) if first is None else first
+    max_window = float(cfg.tracker_window_max_ms) / 1000.0
+    ab = self.pattern_type == "alternating" and self.alt_interval_a and self.alt_interval_b
+    if ab:
+        fast = min(float(self.alt_interval_a), float(self.alt_interval_b))
+        slow = max(float(self.alt_interval_a), float(self.alt_interval_b))
+        lead = _ab_lead(self, slow)
+    targets = []
+    for j, interval in enumerate(intervals):
+        if j:
+            t += interval
+        w = None if window is None else min(max_window, window * (j + 1) ** 0.5)
+        if not ab:
+            targets.append(PressTarget(t, 0.0 if w is None else t - w, w, interval))
+        elif abs(interval - slow) < abs(interval - fast):
+            if w is None:
+                pre_guard = max(0.0, float(cfg.ab_pre_guard_ms) / 1000.0)
+                phase = 0.001 * float(self.ab_phase_ms or 0)
+            else:
+                pre_guard = w
+                phase = 0.0
+            aim = max(last_gray_time, t - lead - max(-0.050, min(0.050, phase)))
+            targets.append(PressTarget(aim, max(0.0, aim - pre_guard), w, slow))
+    return targets
+
+
+def _use_target(self, targets):
+    """Adopt the first of `targets` as the scheduled target; return its time."""
+    if not targets:
+        return None
+    target = targets[0]
+    self._not_before_time = target.not_before
+    self._target_window = target.window
+    self._last_target_interval = target.interval
+    return target.time
+
+
+def _forget_pattern(self):
+    """Clear the learned pattern and the prediction helpers derived from it."""
     self.average_interval = None
     self.single_effective_interval = None
     # Pattern flags
@@ -335,6 +1037,25 @@ def reset_pattern_learning(self):
     self.pattern_type = "single"
     self.alt_interval_a = None
     self.alt_interval_b = None
+    self.cycle_intervals = None
+    self.markov_model = None
+    # Prediction helpers
+    self._not_before_time = 0.0
+    self._next_predicted_at = None
+    self._next_predicted_from = None
+    self._last_schedule_from_ts = None
+    self._target_window = None
+    self.active_predictor = None
+    # A/B helpers
+    self._ab_slow_start_time = None
+    self._ab_expect_slow_next = False
+
+
+def reset_pattern_learning(self):
+    """Reset all learned patterns and gating state."""
+    # Bounded onset history, with the tuning knobs resolved once for it
+    self.pattern = PatternState(pattern_config(self))
+    _forget_pattern(self)
     # Mode flags
     self.learning_mode = True
     self.prediction_active = False
@@ -346,14 +1067,6 @@ def reset_pattern_learning(self):
     self.white_streak = 0
     self.gray_streak = 0
     self.press_lock_until = 0.0
-    # Prediction helpers
-    self._not_before_time = 0.0
-    self._next_predicted_at = None
-    self._next_predicted_from = None
-    self._last_schedule_from_ts = None
-    # A/B helpers
-    self._ab_slow_start_time = None
-    self._ab_expect_slow_next = False
     try:
         # keep phase setting sticky but safe
         if getattr(self, 'ab_phase_ms', None) is None:
@@ -369,3 +1082,98 @@ def reset_pattern_learning(self):
         print("Pattern learning reset!")
     except Exception:
         pass
+
+
+class AreaTrack:
+    """Per-area pattern state for multi-ROI monitoring.
+
+    Holds its own PatternState (timestamps, intervals), learned pattern,
+    edge/coverage state, A/B phase, pipeline delay, prediction counters and
+    prediction token (so invalidating one area never cancels another
+    area's press), and delegates every other attribute (tuning knobs, frame
+    timestamp, session flags) to the owning detector, so the FDM_pattern,
+    FDM_detection and FDM_scheduler functions run on it unchanged. Only a
+    track with `schedules_presses` set schedules presses.
+    """
+
+    __slots__ = (
+        '_detector', 'area', 'auto_predict', 'schedules_presses',
+        'ab_phase_ms', 'pipeline_delay_s', 'successful_predictions', 'total_predictions',
+        '_token_lock', '_prediction_token',
+        'pattern', 'average_interval', 'single_effective_interval',
+        'pattern_established', 'pattern_type', 'alt_interval_a', 'alt_interval_b',
+        'cycle_intervals', 'markov_model', 'learning_mode', 'prediction_active', 'current_state', 'last_state',
+        'pressed_this_event', 'white_streak', 'gray_streak', 'press_lock_until',
+        '_last_target_interval', '_not_before_time', '_next_predicted_at', '_next_predicted_from',
+        '_last_schedule_from_ts', '_target_window', 'active_predictor', '_ab_slow_start_time', '_ab_expect_slow_next',
+        'last_gray_count', 'last_white_count', 'last_total_px', 'last_counts_exact',
+        '_coverage_prev', '_coverage_cur', '_coverage_edge', '_coverage_peak', 'coverage_slope',
+    )
+
+    def __init__(self, detector, area, auto_predict=False):
+        object.__setattr__(self, '_detector', detector)
+        for name in self.__slots__[1:]:
+            object.__setattr__(self, name, None)
+        self.area = area
+        self.auto_predict = auto_predict
+        self.current_state = "UNKNOWN"
+        self.last_state = "UNKNOWN"
+        self.last_gray_count = 0
+        self.last_white_count = 0
+        self.last_total_px = 0
+        self.last_counts_exact = True
+        self._last_target_interval = None
+        self.schedules_presses = False
+        self._token_lock = threading.Lock()
+        self._prediction_token = 0
+        reset_pattern_learning(self)
+
+    def __getattr__(self, name):
+        return getattr(object.__getattribute__(self, '_detector'), name)
+
+    @property
+    def gray_timestamps(self):
+        return self.pattern.timestamps
+
+    @property
+    def intervals(self):
+        return self.pattern.intervals
+
+    def __setattr__(self, name, value):
+        if name in AreaTrack.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._detector, name, value)
+
+    def record_gray_appearance_safe(self, ts=None):
+        return record_gray_appearance_safe(self, ts)
+
+    def calculate_pattern_v2(self):
+        return calculate_pattern_v2(self)
+
+    def predict_next_gray(self):
+        return predict_next_gray(self)
+
+    def predict_next_target_time(self):
+        return predict_next_target_time(self)
+
+    def project_targets(self):
+        return project_targets(self)
+
+    def reset_pattern_learning(self):
+        return reset_pattern_learning(self)
+
+    def relearn_pattern(self, timestamps=()):
+        return relearn_pattern(self, timestamps)
+
+    def schedule_predictive_press_safe(self, predicted_time):
+        import FDM_scheduler as fdm_scheduler
+        return fdm_scheduler.schedule_predictive_press_safe(self, predicted_time)
+
+    def invalidate_predictions(self):
+        import FDM_scheduler as fdm_scheduler
+        return fdm_scheduler.invalidate_predictions(self)
+
+    def check_prediction_accuracy(self):
+        import FDM_scheduler as fdm_scheduler
+        return fdm_scheduler.check_prediction_accuracy(self)
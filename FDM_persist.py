@@ -1,5 +1,6 @@
 import os
 import json
+import numpy as np
 
 
 def _areas_file_path(self):
@@ -13,8 +14,17 @@ def _areas_file_path(self):
 def _persist_saved_areas(self):
     try:
         path = self._areas_file_path()
+        masks = getattr(self, '_area_masks', None) or {}
+        data = []
+        for area in self._saved_areas:
+            idx = masks.get(tuple(area))
+            if idx is None:
+                data.append(list(area))
+            else:
+                # Areas with a learned active-pixel mask are stored as objects
+                data.append({"area": list(area), "active_idx": [int(i) for i in idx]})
         with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self._saved_areas, f, ensure_ascii=False, indent=2)
+            json.dump(data, f, ensure_ascii=False, indent=2)
     except Exception:
         pass
 
@@ -27,10 +37,21 @@ def _load_saved_areas(self):
                 data = json.load(f)
             if isinstance(data, list):
                 cleaned = []
+                masks = {}
                 for it in data:
-                    if isinstance(it, (list, tuple)) and len(it) == 4:
+                    if isinstance(it, dict):
+                        area = it.get("area")
+                        if not (isinstance(area, (list, tuple)) and len(area) == 4):
+                            continue
+                        area = tuple(area)
+                        idx = it.get("active_idx")
+                        if isinstance(idx, list) and idx:
+                            masks[area] = np.unique(np.asarray(idx, dtype=np.intp))
+                        cleaned.append(area)
+                    elif isinstance(it, (list, tuple)) and len(it) == 4:
                         cleaned.append(tuple(it))
                 self._saved_areas = cleaned
+                self._area_masks = masks
     except Exception:
         pass
 
@@ -1,32 +1,35 @@
 import time
 import threading
-import pyautogui
-import mss
 
 # Grouped feature modules
 import FDM_capture as fdm_capture
 import FDM_detection as fdm_detection
 import FDM_pattern as fdm_pattern
+import FDM_batch as fdm_batch
 import FDM_scheduler as fdm_scheduler
 import FDM_input as fdm_input
 import FDM_ui as fdm_ui
 import FDM_persist as fdm_persist
+import FDM_replay as fdm_replay
 
 
 class PredictiveTimingDetector:
     """Thin orchestrator that wires grouped FDM_* modules together.
 
     All domain logic lives in small focused modules:
-      - FDM_capture: ultra-fast screen capture and FPS
+      - FDM_capture: screen capture (full region, ROI-only, threaded ring) and FPS
       - FDM_detection: gray/white classification
       - FDM_pattern: pattern learning and prediction logic
+      - FDM_stats: incremental rolling-window interval statistics
       - FDM_scheduler: predictive press scheduling & accuracy tracking
       - FDM_input: keyboard/mouse listeners and key flags
       - FDM_ui: area selection and monitor UI loop
       - FDM_persist: saved areas persistence helpers
+      - FDM_replay: mmap-backed ROI frame recording and replay frame source
+      - FDM_simulator: synthetic wheel frame source with ground-truth onsets
     """
 
-    def __init__(self, x1=527, y1=196, x2=1374, y2=916):
+    def __init__(self, x1=527, y1=196, x2=1374, y2=916, frame_source=None, headless=False):
         # Region bounds
         self.screen_x1 = x1
         self.screen_y1 = y1
@@ -38,17 +41,39 @@ class PredictiveTimingDetector:
         self.monitoring = False
         self.selecting = False
 
-        # Timing pattern variables
-        self.gray_timestamps = []
-        self.intervals = []
+        # Timing pattern variables (onset history lives in self.pattern)
         self.average_interval = None
         self.pattern_established = False
         self.min_samples = 3
+        # Onsets/intervals kept in the bounded pattern history
+        self.pattern_history_n = 256
 
         # Advanced pattern support
-        self.pattern_type = "single"  # 'single' or 'alternating'
+        self.pattern_type = "single"  # 'single', 'alternating', 'cycle' or 'markov'
         self.alt_interval_a = None
         self.alt_interval_b = None
+        # Period-k cycles (k = 3..cycle_max_k) found by autocorrelation over
+        # the last cycle_window_n intervals; per-phase means by index % k
+        self.cycle_intervals = None
+        self.cycle_detection = True
+        self.cycle_max_k = 6
+        self.cycle_window_n = 36
+        self.cycle_min_acf = 0.5
+        self.cycle_max_cv = 20
+        self.cycle_min_cycles = 2
+        self.cycle_min_explained = 0.95
+        # Irregular sequences: 1-D k-means duration classes (up to
+        # markov_max_classes) over the last markov_window_n intervals and a
+        # Markov chain of order <= markov_max_order over them; presses only
+        # when the next class has probability >= markov_min_confidence
+        self.markov_model = None
+        self.markov_enabled = True
+        self.markov_window_n = 48
+        self.markov_min_samples = 12
+        self.markov_max_classes = 4
+        self.markov_max_order = 2
+        self.markov_min_accuracy = 0.8
+        self.markov_min_confidence = 0.6
         self.auto_predict = True
         self.small_gap_threshold = 0.4
         self._last_target_interval = None
@@ -57,12 +82,54 @@ class PredictiveTimingDetector:
         self.ab_lead_ms = 22
         self.ab_pre_guard_ms = 5
         self.ab_spin_wait_ms = 6
+        self.ab_pre_spin_ms = 6
         self.ab_phase_ms = 0
         self.ab_phase_alpha = 0.4
         self.ab_phase_min = -60
         self.ab_phase_max = 60
         self.ab_target_after_ms = 6
         self._ab_expect_slow_next = False
+        self._ab_slow_start_time = None
+        # Kalman tracker of onset phase, period and drift (FDM_stats.OnsetTracker),
+        # used for predictions once it has `tracker_min_updates` onsets. Noise
+        # terms are standard deviations in ms; the press guard and GRAY
+        # spin-wait span tracker_window_sigmas of its uncertainty
+        self.tracker_enabled = True
+        self.tracker_min_updates = 3
+        self.tracker_meas_ms = 2.0
+        self.tracker_phase_ms = 2.0
+        self.tracker_period_ms = 1.0
+        self.tracker_drift_ms = 0.2
+        self.tracker_gate_sigmas = 6.0
+        self.tracker_window_sigmas = 3.0
+        self.tracker_window_min_ms = 3
+        self.tracker_window_max_ms = 30
+        self._target_window = None
+        # Pattern-change detection: two-sided CUSUM over interval residuals in
+        # units of max(change_sigma_frac * expected, change_sigma_min_ms); when
+        # it passes change_threshold the pattern is re-learned from the
+        # intervals after the change
+        self.change_detection = True
+        self.change_sigma_frac = 0.05
+        self.change_sigma_min_ms = 4.0
+        self.change_drift = 0.5
+        self.change_threshold = 5.0
+        # Predictor registry (FDM_pattern.PREDICTORS): every model guesses the
+        # next interval on each onset and is scored by an EWMA (alpha
+        # predictor_score_alpha) of its absolute error. 'best' presses on the
+        # lowest-error model, 'blend' on an inverse-error weighted blend of
+        # those within predictor_blend_ratio of it, 'pattern' on the pattern
+        # type's own prediction (tracker once settled)
+        self.predictor_mode = 'best'
+        self.predictor_score_alpha = 0.1
+        self.predictor_min_scored = 5
+        self.predictor_blend_ratio = 2.0
+        self.active_predictor = None
+        # Press targets are projected this many pattern cycles ahead, so an
+        # onset detected too late to make rolls over to a later cycle (0: off)
+        self.target_horizon_cycles = 3
+        # Rolling statistics window (intervals per A/B phase) and trim
+        # fraction for the trimmed A/B means
         self.ab_window_n = 8
         self.ab_trim_frac = 0.2
         self.ab_min_pairs = 5
@@ -90,11 +157,59 @@ class PredictiveTimingDetector:
         self.gray_v_max = 210
         self.white_s_thresh = 40
         self.white_v_min = 190
+        # Classifier: "hsv" (cvtColor + NumPy masks), "lut" (quantized RGB
+        # class table rebuilt on threshold change; exact at 8 bits; opt-in,
+        # only worth it where bench_classifiers shows it fastest) or "cv"
+        # (OpenCV-only and releases the GIL, but has not measurably reduced
+        # press-thread wake jitter; see bench_wake_jitter)
+        self.classifier_backend = "hsv"
+        self.lut_bits = 8
+        # fast_gray_mode: stop the "hsv" scan once enough gray pixels were
+        # found. Off by default: onset frames get cheaper on large ROIs
+        # (120x160: 218 -> 29 us) but white frames, most of them, get
+        # dearer (219 -> 313 us); see bench_early_exit
+        self.gray_early_exit = False
+        self.early_exit_block_px = 256
+        self.last_counts_exact = True
+        # Skip classification when the ROI is identical to the last
+        # classified frame (tolerance in max abs pixel difference)
+        self.frame_skip_enabled = True
+        self.frame_skip_tolerance = 0
+        self._skip_ref = None
+        self._det_buffers = None
+        self.classify_skips = 0
+        self.classify_runs = 0
+        # Learned per-area mask of pixels that actually toggle between white
+        # and gray; once learned only those pixels are classified
+        self.active_mask_enabled = True
+        self.active_mask_min_events = 4
+        self.active_mask_min_pixels = 4
+        self.active_idx = None
+        self._active_area = None
+        self._active_shape = None
+        self._active_buf = None
+        self._active_decided = False
+        self._active_seen = None
+        # Sub-frame onset interpolation from gray-coverage ramps
+        self.subframe_onset = True
+        self.coverage_slope = None
+        self._coverage_prev = None
+        self._coverage_cur = None
+        self._coverage_edge = None
+        self._coverage_peak = None
+        self.last_gray_count = 0
+        self.last_white_count = 0
+        self.last_total_px = 0
 
         # Prediction state
         self.next_predicted_time = None
         self.prediction_active = False
         self.early_press_offset = 0.05
+        # Capture-to-decision delay (seconds, smoothed) fed into press times
+        self.pipeline_delay_s = None
+        self.pipeline_delay_alpha = 0.1
+        self.pipeline_delay_max_s = 0.050
+        self.compensate_pipeline_delay = True
 
         # Detection state
         self.detection_active = False
@@ -146,22 +261,75 @@ class PredictiveTimingDetector:
 
         # Saved areas for this session
         self._saved_areas = []
+        self._area_masks = {}
+        # Areas learned to need the full ROI (no smaller mask), this session
+        self._full_roi_areas = set()
+        # Multi-ROI pattern state per area, kept across monitor_areas sessions
+        self._area_tracks = {}
         self._saved_area_idx = 0
         self.auto_cycle_saved_areas = True
+        # Watch all remaining saved areas from one grab (presses follow the
+        # current one)
+        self.multi_roi_mode = False
         try:
             fdm_persist._load_saved_areas(self)
         except Exception:
             pass
 
+        # Headless runs (simulator/replay on machines without a display)
+        # skip screen capture, key input and all OpenCV windows
+        self.headless = headless
+        self.show_ui = not headless
+        # Restart to area selection after each SPACE press (simulations
+        # turn this off to keep pressing every cycle)
+        self.stop_after_press = True
+
         # Initialize screen capture region
-        self.sct = mss.mss()
+        self.sct = None
+        if not headless:
+            import mss
+            self.sct = mss.mss()
         self.monitor = {"top": y1, "left": x1, "width": x2 - x1, "height": y2 - y1}
-
-        # Safety off for high-speed presses
-        pyautogui.FAILSAFE = False
-
-        # Start input listener and exit watcher
-        self.start_keyboard_listener()
+        # Grab only the ROI bounding box while monitoring (full region is
+        # still used for area selection)
+        self.roi_capture_mode = True
+        # ROI frames as zero-copy BGRA views over mss's raw buffer
+        self.capture_bgra = True
+        # Capture on a dedicated thread into a timestamped ring buffer so
+        # display work never delays the next grab
+        self.capture_threaded = True
+        self.capture_ring_size = 8
+        self.frames_consumed = 0
+        self.frames_dropped = 0
+        self.frame_ts_ns = None
+        # Capture-rate governor: idle far from the predicted onset, burst
+        # at full rate inside a window around it
+        self.governor_enabled = True
+        self.governor_idle_fps = 60
+        self.governor_burst_ms = 40
+        self.governor_burst_frac = 0.15
+        self.governor_state = "FULL"
+        # (next_onset, window) published by the main thread for the governor
+        self.governor_target = None
+        # Optional frame source replacing the live ROI grab (replay, etc.)
+        # and directory to record monitored ROI frames into (None = off)
+        self.frame_source = frame_source
+        self.record_dir = None
+
+        if not headless:
+            import pyautogui
+            # Safety off for high-speed presses
+            pyautogui.FAILSAFE = False
+
+            # Start input listener
+            self.start_keyboard_listener()
+        # Bounded pattern history plus a snapshot of the knobs above
+        # (refreshed by reset_pattern_learning / at monitor start)
+        self.pattern = fdm_pattern.PatternState(fdm_pattern.pattern_config(self))
+        # Snapshot of the per-frame detection knobs (refreshed at monitor start)
+        self.detection = fdm_detection.detection_config(self)
+
+        # Exit watcher
         threading.Thread(target=self._one_shot_exit_watcher, daemon=True).start()
 
         print("PREDICTIVE TIMING DETECTOR")
@@ -191,16 +359,82 @@ class PredictiveTimingDetector:
     def ultra_fast_capture(self):
         return fdm_capture.ultra_fast_capture(self)
 
+    def roi_capture(self, area):
+        return fdm_capture.roi_capture(self, area)
+
+    def governor_delay(self):
+        return fdm_capture.governor_delay(self)
+
+    def publish_governor_target(self):
+        return fdm_capture.publish_governor_target(self)
+
+    def start_capture_thread(self, area):
+        return fdm_capture.start_capture_thread(self, area)
+
+    def stop_capture_thread(self):
+        return fdm_capture.stop_capture_thread(self)
+
+    def latest_frame(self, timeout=0.1):
+        return fdm_capture.latest_frame(self, timeout)
+
+    # -------- Recording wrappers --------
+    def record_frame(self, area, region):
+        return fdm_replay.record_frame(self, area, region)
+
+    def stop_recording(self):
+        return fdm_replay.stop_recording(self)
+
+    def classify_recording(self, path, chunk_size=1024):
+        return fdm_replay.classify_recording(self, path, chunk_size)
+
     # -------- Detection wrapper --------
     def classify_region_state(self, region):
         return fdm_detection.classify_region_state(self, region)
 
+    def region_unchanged(self, region):
+        return fdm_detection.region_unchanged(self, region)
+
+    def track_gray_coverage(self):
+        return fdm_detection.track_gray_coverage(self)
+
+    def estimate_onset_time(self):
+        return fdm_detection.estimate_onset_time(self)
+
+    def classify_frames(self, frames, chunk_size=1024):
+        return fdm_detection.classify_frames(self, frames, chunk_size)
+
+    def refresh_detection_config(self):
+        return fdm_detection.refresh_detection_config(self)
+
+    def select_active_mask(self, area):
+        return fdm_detection.select_active_mask(self, area)
+
+    def reset_active_mask(self):
+        return fdm_detection.reset_active_mask(self)
+
+    def observe_active_pixels(self, region):
+        return fdm_detection.observe_active_pixels(self, region)
+
+    def finalize_active_mask(self):
+        return fdm_detection.finalize_active_mask(self)
+
     # -------- Pattern wrappers --------
+    @property
+    def gray_timestamps(self):
+        return self.pattern.timestamps
+
+    @property
+    def intervals(self):
+        return self.pattern.intervals
+
+    def refresh_pattern_config(self):
+        return fdm_pattern.refresh_pattern_config(self)
+
     def record_gray_appearance(self):
         return fdm_pattern.record_gray_appearance(self)
 
-    def record_gray_appearance_safe(self):
-        return fdm_pattern.record_gray_appearance_safe(self)
+    def record_gray_appearance_safe(self, ts=None):
+        return fdm_pattern.record_gray_appearance_safe(self, ts)
 
     def calculate_pattern(self):
         return fdm_pattern.calculate_pattern(self)
@@ -214,9 +448,18 @@ class PredictiveTimingDetector:
     def predict_next_target_time(self):
         return fdm_pattern.predict_next_target_time(self)
 
+    def project_targets(self):
+        return fdm_pattern.project_targets(self)
+
+    def analyze_pattern_batch(self, values, offsets):
+        return fdm_batch.analyze_pattern_batch(self, values, offsets)
+
     def reset_pattern_learning(self):
         return fdm_pattern.reset_pattern_learning(self)
 
+    def relearn_pattern(self, timestamps=()):
+        return fdm_pattern.relearn_pattern(self, timestamps)
+
     # -------- Scheduler wrappers --------
     def _dynamic_press_offset(self, interval_len):
         return fdm_scheduler._dynamic_press_offset(self, interval_len)
@@ -243,6 +486,9 @@ class PredictiveTimingDetector:
     def monitor_area(self, area):
         return fdm_ui.monitor_area(self, area)
 
+    def monitor_areas(self, areas):
+        return fdm_ui.monitor_areas(self, areas)
+
     # -------- Orchestration --------
     def run(self):
         """Main run loop."""
@@ -290,7 +536,12 @@ class PredictiveTimingDetector:
                     pass
                 self._restart_after_press = False
                 self._has_pressed_space = False
-                self.monitor_area(area)
+                if (getattr(self, 'multi_roi_mode', False) and getattr(self, '_saved_areas', None)
+                        and tuple(area) in [tuple(a) for a in self._saved_areas]):
+                    rest = [tuple(a) for a in self._saved_areas[self._saved_area_idx + 1:]]
+                    self.monitor_areas([tuple(area)] + [a for a in rest if a != tuple(area)])
+                else:
+                    self.monitor_area(area)
                 first_iter = False
                 # Advance to next saved area if restarting
                 try:
@@ -0,0 +1,170 @@
+import os
+import mmap
+import time
+import struct
+import numpy as np
+
+import FDM_detection as fdm_detection
+
+
+# On-disk layout: a 64-byte header followed by fixed-size records of
+# [int64 capture_ts_ns][height * width * channels uint8 pixels].
+_MAGIC = b"FDMREC01"
+_HEADER = struct.Struct("<8sIII4i")
+_HEADER_SIZE = 64
+
+
+def _record_dtype(shape):
+    return np.dtype([("ts_ns", "<i8"), ("px", np.uint8, tuple(shape))])
+
+
+class FrameRecorder:
+    """Append-only writer for ROI frames plus their capture timestamps."""
+
+    def __init__(self, path, shape, area=(0, 0, 0, 0)):
+        h, w, c = (int(v) for v in shape)
+        self.path = path
+        self.shape = (h, w, c)
+        self.frames = 0
+        self._f = open(path, "wb", buffering=1 << 20)
+        header = _HEADER.pack(_MAGIC, h, w, c, *(int(v) for v in area))
+        self._f.write(header.ljust(_HEADER_SIZE, b"\0"))
+
+    def write(self, frame, ts_ns):
+        if frame.shape != self.shape:
+            return False
+        self._f.write(struct.pack("<q", int(ts_ns)))
+        self._f.write(np.ascontiguousarray(frame))
+        self.frames += 1
+        return True
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def open_recording(path):
+    """Map a recording into memory; return (ts_ns, frames, area).
+
+    Both arrays are zero-copy views over an mmap of the file, so sessions
+    larger than RAM can be scanned. A partially written trailing record is
+    ignored.
+    """
+    with open(path, "rb") as f:
+        head = f.read(_HEADER_SIZE)
+        if len(head) < _HEADER_SIZE or head[:8] != _MAGIC:
+            raise ValueError(f"not an FDM recording: {path}")
+        _, h, w, c, ax1, ay1, ax2, ay2 = _HEADER.unpack_from(head)
+        size = os.fstat(f.fileno()).st_size
+        dtype = _record_dtype((h, w, c))
+        count = (size - _HEADER_SIZE) // dtype.itemsize
+        if count <= 0:
+            empty = np.empty((0, h, w, c), dtype=np.uint8)
+            return np.empty(0, dtype=np.int64), empty, (ax1, ay1, ax2, ay2)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    records = np.frombuffer(mm, dtype=dtype, count=count, offset=_HEADER_SIZE)
+    return records["ts_ns"], records["px"], (ax1, ay1, ax2, ay2)
+
+
+class ReplayFrameSource:
+    """Frame source that plays a recording back in place of the live screen.
+
+    grab(area) returns (frame, ts_ns) like the live capture path, or
+    (None, None) once the recording is exhausted. Timestamps are shifted onto
+    the current perf_counter_ns clock so scheduling code sees consistent
+    times. With `realtime` the original frame cadence is reproduced;
+    otherwise frames are returned as fast as they are requested. Frames are
+    read-only views into the mmap; the recorded area is used regardless of
+    the `area` argument.
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.ts_ns, self.frames, self.area = open_recording(path)
+        self.index = 0
+        self.presses = []
+        self._offset_ns = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def grab(self, area=None):
+        if self.index >= len(self.frames):
+            if not self.loop or len(self.frames) == 0:
+                return None, None
+            self.index = 0
+            self._offset_ns = None
+        i = self.index
+        self.index += 1
+        if self._offset_ns is None:
+            self._offset_ns = time.perf_counter_ns() - int(self.ts_ns[i])
+        ts_ns = int(self.ts_ns[i]) + self._offset_ns
+        if self.realtime:
+            wait_s = (ts_ns - time.perf_counter_ns()) * 1e-9
+            if wait_s > 0:
+                time.sleep(wait_s)
+        return self.frames[i], ts_ns
+
+    def on_press(self, ts):
+        """Record a press instead of sending a key during replay."""
+        self.presses.append(ts)
+
+
+def classify_recording(self, path, chunk_size=1024):
+    """Classify every frame of a recording offline.
+
+    Returns (ts_ns, codes, gray_counts, white_counts); codes index
+    FDM_detection.STATE_NAMES. Frames are read from the mmap one chunk at
+    a time, so recordings larger than RAM can be re-analysed.
+    """
+    ts_ns, frames, _ = open_recording(path)
+    codes, gray, white, _ = fdm_detection.classify_frames(self, frames, chunk_size)
+    return np.array(ts_ns), codes, gray, white
+
+
+def start_recording(self, area, shape):
+    """Open a new recording for `area` under `self.record_dir`."""
+    stop_recording(self)
+    record_dir = getattr(self, 'record_dir', None)
+    if not record_dir:
+        return None
+    try:
+        os.makedirs(record_dir, exist_ok=True)
+        x1, y1, x2, y2 = (int(v) for v in area)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(record_dir, f"fdm_{stamp}_{x1}_{y1}_{x2}_{y2}.fdmrec")
+        self._recorder = FrameRecorder(path, shape, area)
+        print(f"Recording ROI frames to {path}")
+    except Exception as e:
+        print(f"Recording disabled: {e}")
+        self._recorder = None
+    return self._recorder
+
+
+def record_frame(self, area, region):
+    """Append `region` and its capture timestamp to the active recording."""
+    if not getattr(self, 'record_dir', None) or region.ndim != 3:
+        return
+    rec = getattr(self, '_recorder', None)
+    if rec is None or rec.shape != region.shape:
+        rec = start_recording(self, area, region.shape)
+        if rec is None:
+            self.record_dir = None
+            return
+    ts_ns = getattr(self, 'frame_ts_ns', None)
+    rec.write(region, ts_ns if ts_ns is not None else time.perf_counter_ns())
+
+
+def stop_recording(self):
+    rec = getattr(self, '_recorder', None)
+    if rec is None:
+        return
+    try:
+        rec.close()
+        print(f"Recorded {rec.frames} frames to {rec.path}")
+    except Exception:
+        pass
+    self._recorder = None
@@ -1,6 +1,5 @@
 import time
 import threading
-import pyautogui
 
 
 def _dynamic_press_offset(self, interval_len: float | None) -> float:
@@ -20,6 +19,59 @@ def _dynamic_press_offset(self, interval_len: float | None) -> float:
     return 0.015
 
 
+def _pipeline_delay(self) -> float:
+    """Smoothed capture-to-decision delay to add back onto press times.
+
+    Onsets are stamped at capture time, so predictions are in screen time.
+    The press offsets were tuned against onsets stamped after processing,
+    which included this delay on average; adding the smoothed delay keeps
+    that calibration while dropping its per-event jitter.
+    """
+    cfg = self.pattern.config
+    if not cfg.compensate_pipeline_delay:
+        return 0.0
+    try:
+        delay = float(self.pipeline_delay_s or 0.0)
+        max_delay = float(cfg.pipeline_delay_max_s)
+    except Exception:
+        return 0.0
+    return max(0.0, min(max_delay, delay))
+
+
+def _send_press(self):
+    """Press SPACE, or hand the press to the frame source when replaying."""
+    source = getattr(self, 'frame_source', None)
+    if source is not None and hasattr(source, 'on_press'):
+        source.on_press(time.perf_counter())
+        return
+    import pyautogui
+    pyautogui.press('space')
+
+
+def _target_press_time(self, predicted_time, not_before, interval_len, delay):
+    """Press instant for a target: the predicted time shifted by the pipeline
+    delay minus the dynamic offset, never before `not_before` (+ delay)."""
+    press_time = predicted_time + delay - _dynamic_press_offset(self, interval_len)
+    guard = float(not_before or 0.0) + delay + 0.001
+    return max(press_time, guard)
+
+
+def _rollover_press_time(self, delay):
+    """Press instant of the earliest projected target still ahead, or None.
+
+    Adopts that target's guard, window and interval for the press.
+    """
+    now = time.perf_counter()
+    for target in self.project_targets():
+        press_time = _target_press_time(self, target.time, target.not_before, target.interval, delay)
+        if press_time > now:
+            self._not_before_time = target.not_before
+            self._target_window = target.window
+            self._last_target_interval = target.interval
+            return press_time
+    return None
+
+
 def invalidate_predictions(self):
     with self._token_lock:
         self._prediction_token += 1
@@ -75,116 +127,112 @@ def schedule_predictive_press_safe(self, predicted_time):
 
     In A/B mode, if ab_event_driven_press is True and we expect the slow interval next,
     wait for the actual GRAY onset at the ROI to press, rather than a strict timer.
+    All times are on the perf_counter clock; the measured pipeline delay is
+    added via `_pipeline_delay`. A timed target that can no longer be made
+    rolls over to the earliest projected target still ahead.
     """
+    delay = _pipeline_delay(self)
+    # Knobs come from the pattern's config snapshot, not per-call lookups
+    cfg = self.pattern.config
+
     # Event-driven path for A/B
-    if (self.pattern_type == "alternating" and getattr(self, 'ab_event_driven_press', True)
-            and getattr(self, '_ab_expect_slow_next', False)):
+    if (self.pattern_type == "alternating" and cfg.ab_event_driven_press
+            and self._ab_expect_slow_next):
         with self._token_lock:
             self._prediction_token += 1
             token = self._prediction_token
 
         def wait_for_gray_and_press():
             # Wait until early guard time
-            nb = float(getattr(self, '_not_before_time', time.time()))
-            while time.time() < nb:
+            nb = float(self._not_before_time or time.perf_counter()) + delay
+            while time.perf_counter() < nb:
                 time.sleep(0.0005)
 
             # Race: press at earlier of (predicted_time - race_early) or GRAY onset
-            try:
-                race_early = max(0.0, float(getattr(self, 'ab_race_early_ms', 3)) / 1000.0)
-            except Exception:
-                race_early = 0.003
-            race_deadline = max(nb, predicted_time - race_early)
+            race_early = max(0.0, float(cfg.ab_race_early_ms) / 1000.0)
+            race_deadline = max(nb, predicted_time + delay - race_early)
 
             # Wait for GRAY onset or race deadline (with overall timeout as safety)
-            timeout_s = max(0.2, float(getattr(self, '_last_target_interval', 0.4)))
-            deadline = time.time() + timeout_s
-            if getattr(self, 'debug_ab', False):
+            timeout_s = max(0.2, float(self._last_target_interval or 0.4))
+            deadline = time.perf_counter() + timeout_s
+            if cfg.debug_ab:
                 try:
                     print(f"AB debug: event-driven race (race_early={race_early*1000:.0f}ms)")
                 except Exception:
                     pass
-            while time.time() < deadline:
+            while time.perf_counter() < deadline:
                 with self._token_lock:
                     if token != self._prediction_token:
                         return
                 if not self.prediction_active or not self.pattern_established:
                     return
-                if time.time() < self.press_lock_until or self.pressed_this_event:
+                if time.perf_counter() < self.press_lock_until or self.pressed_this_event:
                     return
                 # Detect GRAY onset (allow immediate GRAY without requiring explicit WHITE->GRAY edge)
                 if self.current_state == "GRAY":
                     break
                 # Race deadline reached
-                if time.time() >= race_deadline:
+                if time.perf_counter() >= race_deadline:
                     break
                 time.sleep(0.0005)
 
             # Final press
             try:
-                pyautogui.press('space')
+                _send_press(self)
             except Exception:
                 pass
             self.total_predictions += 1
             print(f"PREDICTIVE SPACE PRESS! (#{self.total_predictions})")
-            if getattr(self, 'debug_ab', False):
+            if cfg.debug_ab:
                 try:
-                    now2 = time.time()
-                    slow_start = getattr(self, '_ab_slow_start_time', None)
+                    now2 = time.perf_counter()
+                    slow_start = self._ab_slow_start_time
                     if slow_start:
                         delta_ms = (now2 - slow_start) * 1000.0
                         print(f"AB debug: pressed {delta_ms:.0f}ms after slow-start (target ~0 to +10ms)")
                 except Exception:
                     pass
             self.pressed_this_event = True
-            try:
-                self.press_lock_until = time.time() + float(getattr(self, 'press_cooldown_s', 0.75))
-            except Exception:
-                pass
+            self.press_lock_until = time.perf_counter() + float(cfg.press_cooldown_s)
             self.invalidate_predictions()
             threading.Timer(0.1, self.check_prediction_accuracy).start()
             # Restart to area selection after each SPACE press
-            self._restart_after_press = True
-            self.monitoring = False
+            if cfg.stop_after_press:
+                self._restart_after_press = True
+                self.monitoring = False
 
         threading.Thread(target=wait_for_gray_and_press, daemon=True).start()
         return
 
     # Timed path (default)
-    # Choose offset dynamically based on the targeted interval length
-    dyn_offset = _dynamic_press_offset(self, getattr(self, '_last_target_interval', None))
-    press_time = predicted_time - dyn_offset
-    # Ensure we never press before a required point in time (e.g., after fast interval)
-    try:
-        guard = float(getattr(self, '_not_before_time', 0.0)) + 0.001
-        if press_time < guard:
-            press_time = guard
-    except Exception:
-        pass
-    if press_time <= time.time():
-        return
+    # Offset chosen from the targeted interval length; never press before a
+    # required point in time (e.g., after fast interval)
+    press_time = _target_press_time(self, predicted_time, self._not_before_time,
+                                    self._last_target_interval, delay)
+    if press_time <= time.perf_counter():
+        # Detected too late for this onset: roll over to a later cycle
+        press_time = _rollover_press_time(self, delay)
+        if press_time is None:
+            return
     with self._token_lock:
         self._prediction_token += 1
         token = self._prediction_token
 
     def delayed_press():
         # High-precision wait: coarse sleep, then spin to reduce overshoot
-        try:
-            pre_spin = max(0.0, float(getattr(self, 'ab_pre_spin_ms', 6)) / 1000.0)
-        except Exception:
-            pre_spin = 0.0
-        now0 = time.time()
+        pre_spin = max(0.0, float(cfg.ab_pre_spin_ms) / 1000.0)
+        now0 = time.perf_counter()
         sleep_until = press_time - pre_spin
         if sleep_until > now0:
             time.sleep(sleep_until - now0)
-        while time.time() < press_time:
+        while time.perf_counter() < press_time:
             time.sleep(0.0005)
 
         # Re-check validity and gating
         with self._token_lock:
             if token != self._prediction_token:
                 return
-        now = time.time()
+        now = time.perf_counter()
         if not self.prediction_active or not self.pattern_established:
             return
         if now < self.press_lock_until:
@@ -192,45 +240,42 @@ def schedule_predictive_press_safe(self, predicted_time):
         if self.pressed_this_event:
             return
 
-        # If we arrived a tad early, wait briefly for GRAY to appear (A/B slow-start alignment)
-        try:
-            spin_budget = max(0.0, float(getattr(self, 'ab_spin_wait_ms', 18)) / 1000.0)
-        except Exception:
-            spin_budget = 0.0
+        # If we arrived a tad early, wait briefly for GRAY to appear (A/B slow-start alignment);
+        # a tracked target waits as long as its uncertainty window instead
+        window = self._target_window
+        spin_budget = window if window is not None else max(0.0, float(cfg.ab_spin_wait_ms) / 1000.0)
         if spin_budget > 0:
-            t0 = time.time()
-            while (time.time() - t0) < spin_budget:
+            t0 = time.perf_counter()
+            while (time.perf_counter() - t0) < spin_budget:
                 if self.current_state == "GRAY":
                     break
                 # short sleep to yield
                 time.sleep(0.0005)
 
         try:
-            pyautogui.press('space')
+            _send_press(self)
         except Exception:
             pass
         self.total_predictions += 1
         print(f"PREDICTIVE SPACE PRESS! (#{self.total_predictions})")
-        if getattr(self, 'debug_ab', False):
+        if cfg.debug_ab:
             try:
-                now2 = time.time()
-                slow_start = getattr(self, '_ab_slow_start_time', None)
+                now2 = time.perf_counter()
+                slow_start = self._ab_slow_start_time
                 if slow_start:
                     delta_ms = (now2 - slow_start) * 1000.0
                     print(f"AB debug: pressed {delta_ms:.0f}ms after slow-start (target ~0 to +10ms)")
             except Exception:
                 pass
         self.pressed_this_event = True
-        try:
-            self.press_lock_until = time.time() + float(getattr(self, 'press_cooldown_s', 0.75))
-        except Exception:
-            pass
+        self.press_lock_until = time.perf_counter() + float(cfg.press_cooldown_s)
 
         # Invalidate any other pending predictions and schedule accuracy check
         self.invalidate_predictions()
         threading.Timer(0.1, self.check_prediction_accuracy).start()
         # Restart to area selection after each SPACE press
-        self._restart_after_press = True
-        self.monitoring = False
+        if cfg.stop_after_press:
+            self._restart_after_press = True
+            self.monitoring = False
 
     threading.Thread(target=delayed_press, daemon=True).start()
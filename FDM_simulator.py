@@ -0,0 +1,172 @@
+import time
+import bisect
+import numpy as np
+
+
+class WheelSimulator:
+    """Synthetic wheel frame source with exact ground-truth gray onsets.
+
+    Produces ROI frames that are WHITE between onsets and turn GRAY for
+    `gray_duration_s` after each onset, using colors inside the default
+    classify_region_state ranges (white: S=0, V=235; gray: S=0, V=128).
+    With `ramp_s` > 0, gray coverage sweeps across the ROI columns over that
+    time, which exercises the sub-frame onset estimator.
+
+    The interval schedule cycles through `periods`: (0.5,) is a constant
+    period, (0.3, 0.6) an A-B alternation, (0.3, 0.3, 0.6) a period-3 cycle.
+    On top of that:
+      - jitter_s: Gaussian noise (sigma, seconds) added to every interval
+      - drift_per_s: relative period change per second of sim time
+      - speed_changes: [(t, factor), ...] abrupt period multipliers from t on
+      - drop_prob: probability that a frame tick is skipped (dropped frame)
+      - static_cols: trailing ROI columns that never toggle, half static
+        gray decoration and half white background (a loosely drawn ROI)
+
+    With `realtime` frames are paced at `fps` on the perf_counter clock, so
+    the scheduler's press threads run against real time and press errors
+    can be measured via on_press. Otherwise a virtual clock advances one
+    frame per grab, which stresses detection and pattern learning at any
+    rate without sleeping.
+    """
+
+    WHITE = (235, 235, 235)
+    GRAY = (128, 128, 128)
+
+    def __init__(self, periods=(0.5,), fps=500, duration_s=30.0, roi=(16, 20),
+                 gray_duration_s=0.08, ramp_s=0.0, jitter_s=0.0, drift_per_s=0.0,
+                 speed_changes=(), drop_prob=0.0, static_cols=0, realtime=True,
+                 bgra=True, start_delay_s=0.1, seed=0):
+        self.periods = tuple(float(p) for p in periods)
+        self.fps = float(fps)
+        self.duration_s = float(duration_s)
+        self.gray_duration_s = float(gray_duration_s)
+        self.ramp_s = float(ramp_s)
+        self.drop_prob = float(drop_prob)
+        self.realtime = realtime
+        self._rng = np.random.default_rng(seed)
+
+        # Ground-truth onset schedule in sim time (seconds from start)
+        changes = sorted((float(t), float(f)) for t, f in speed_changes)
+        onsets = []
+        t = float(start_delay_s)
+        k = 0
+        while t <= self.duration_s:
+            onsets.append(t)
+            period = self.periods[k % len(self.periods)]
+            factor = 1.0 + float(drift_per_s) * t
+            for ct, cf in changes:
+                if t >= ct:
+                    factor *= cf
+            period *= factor
+            if jitter_s:
+                period += self._rng.normal(0.0, jitter_s)
+            t += max(1e-3, period)
+            k += 1
+        self.onsets = np.asarray(onsets, dtype=np.float64)
+        self._onset_list = onsets
+
+        # Frames for every possible gray coverage (0..W toggling gray columns)
+        h, w = (int(v) for v in roi)
+        static = max(0, int(static_cols))
+        channels = 4 if bgra else 3
+        white = np.array(self.WHITE + ((255,) if bgra else ()), dtype=np.uint8)
+        gray = np.array(self.GRAY + ((255,) if bgra else ()), dtype=np.uint8)
+        self._frames = np.empty((w + 1, h, w + static, channels), dtype=np.uint8)
+        for cols in range(w + 1):
+            self._frames[cols, :, :] = white
+            self._frames[cols, :, :cols] = gray
+        # Static decoration: a block of gray that is there in every frame
+        self._frames[:, : max(1, h // 2), w: w + static // 2] = gray
+        self._frames.flags.writeable = False
+        self.shape = (h, w + static, channels)
+        self.active_cols = w
+        self.area = (0, 0, w + static, h)
+
+        self.frame_index = 0
+        self.frames_dropped = 0
+        self.presses = []
+        self._t0_ns = None
+
+    def _coverage(self, t):
+        """Number of gray columns at sim time `t`."""
+        i = bisect.bisect_right(self._onset_list, t) - 1
+        if i < 0:
+            return 0
+        dt = t - self._onset_list[i]
+        if dt >= self.gray_duration_s:
+            return 0
+        w = self.active_cols
+        if self.ramp_s <= 0.0:
+            return w
+        return max(1, min(w, int(np.ceil(w * dt / self.ramp_s))))
+
+    def grab(self, area=None):
+        """Return (frame, ts_ns) for the next frame tick, or (None, None) at the end."""
+        if self._t0_ns is None:
+            self._t0_ns = time.perf_counter_ns()
+        frame_ns = 1e9 / self.fps
+        while self.drop_prob > 0.0 and self._rng.random() < self.drop_prob:
+            self.frame_index += 1
+            self.frames_dropped += 1
+        if self.realtime:
+            # A consumer that idled past some ticks gets the current one
+            behind = int((time.perf_counter_ns() - self._t0_ns) // frame_ns)
+            self.frame_index = max(self.frame_index, behind)
+        tick_ns = self._t0_ns + int(self.frame_index * frame_ns)
+        self.frame_index += 1
+        if self.realtime:
+            wait_s = (tick_ns - time.perf_counter_ns()) * 1e-9
+            if wait_s > 0:
+                time.sleep(wait_s)
+            ts_ns = max(tick_ns, time.perf_counter_ns())
+        else:
+            ts_ns = tick_ns
+        t = (ts_ns - self._t0_ns) * 1e-9
+        if t > self.duration_s:
+            return None, None
+        return self._frames[self._coverage(t)], ts_ns
+
+    def on_press(self, ts):
+        """Record a press (perf_counter seconds) instead of sending a key."""
+        self.presses.append(ts)
+
+    def true_onset_times(self):
+        """Ground-truth onsets on the perf_counter clock (seconds)."""
+        if self._t0_ns is None:
+            return self.onsets.copy()
+        return self.onsets + self._t0_ns * 1e-9
+
+    def match_errors(self, times):
+        """Signed error (seconds) of each time against its nearest true onset."""
+        truth = self.true_onset_times()
+        times = np.asarray(times, dtype=np.float64)
+        if truth.size == 0 or times.size == 0:
+            return np.empty(0, dtype=np.float64)
+        idx = np.searchsorted(truth, times)
+        left = truth[np.clip(idx - 1, 0, truth.size - 1)]
+        right = truth[np.clip(idx, 0, truth.size - 1)]
+        nearest = np.where(np.abs(times - left) <= np.abs(times - right), left, right)
+        return times - nearest
+
+    def press_errors(self):
+        return self.match_errors(self.presses)
+
+
+def simulate(sim, **knobs):
+    """Run a headless PredictiveTimingDetector against `sim` until it ends.
+
+    `knobs` are set as detector attributes before monitoring starts. Returns
+    the detector so recorded onsets, pattern state and sim.press_errors()
+    can be inspected.
+    """
+    from FDM_predictive_detector import PredictiveTimingDetector
+
+    detector = PredictiveTimingDetector(frame_source=sim, headless=True)
+    detector.exit_on_first_space = False
+    detector.stop_after_press = False
+    detector.debug_ab = False
+    for name, value in knobs.items():
+        setattr(detector, name, value)
+    detector.reset_pattern_learning()
+    detector.monitor_area(sim.area)
+    return detector
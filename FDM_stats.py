@@ -0,0 +1,476 @@
+import math
+import bisect
+from array import array
+from collections import deque
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity float history backed by array('d').
+
+    len(), indexing (negative too), slicing and iteration cover the retained
+    values oldest first, like the tail of a list. `total` counts every value
+    ever appended, so parity/phase logic keeps working once old values have
+    been overwritten.
+    """
+
+    __slots__ = ('capacity', 'data', 'total')
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.data = array('d', bytes(8 * self.capacity))
+        self.total = 0
+
+    def append(self, x):
+        self.data[self.total % self.capacity] = x
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def __getitem__(self, i):
+        n = min(self.total, self.capacity)
+        if isinstance(i, slice):
+            start = self.total - n
+            return [self.data[(start + j) % self.capacity] for j in range(*i.indices(n))]
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("ring buffer index out of range")
+        return self.data[(self.total - n + i) % self.capacity]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __repr__(self):
+        return f"RingBuffer({self[:]!r}, total={self.total})"
+
+    def to_array(self):
+        """Retained values, oldest first, as a float64 array."""
+        n = min(self.total, self.capacity)
+        buf = np.frombuffer(self.data, dtype=np.float64)
+        return np.roll(buf, -(self.total % self.capacity))[self.capacity - n:] if n else buf[:0].copy()
+
+    def __array__(self, dtype=None, copy=None):
+        out = self.to_array()
+        return out if dtype is None else out.astype(dtype)
+
+
+class RollingStats:
+    """Mean, stdev and order statistics over the last `size` values.
+
+    Running sums give the mean and sample standard deviation in O(1), and a
+    sorted copy of the window (kept with bisect) gives the median and
+    trimmed means without sorting. The sums are recomputed exactly once per
+    window turnover so floating-point drift cannot build up over long runs.
+    """
+
+    __slots__ = ('size', 'values', 'ordered', 'total', 'total_sq', '_pushes')
+
+    def __init__(self, size):
+        self.size = max(1, int(size))
+        self.values = deque()
+        self.ordered = []
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, x):
+        """Add `x`, evicting the oldest value once the window is full."""
+        x = float(x)
+        self.values.append(x)
+        bisect.insort(self.ordered, x)
+        self.total += x
+        self.total_sq += x * x
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            del self.ordered[bisect.bisect_left(self.ordered, old)]
+            self.total -= old
+            self.total_sq -= old * old
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._pushes = 0
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    def mean(self):
+        n = len(self.values)
+        return self.total / n if n else None
+
+    def stdev(self):
+        """Sample standard deviation (0.0 with fewer than two values)."""
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(var) if var > 0.0 else 0.0
+
+    def median(self):
+        s = self.ordered
+        n = len(s)
+        if not n:
+            return None
+        mid = n // 2
+        return s[mid] if n % 2 else 0.5 * (s[mid - 1] + s[mid])
+
+    def trimmed_mean(self, frac):
+        """Mean without the lowest and highest max(1, n * frac) values.
+
+        Falls back to the plain mean when trimming would leave nothing.
+        """
+        s = self.ordered
+        n = len(s)
+        if not n:
+            return None
+        k = max(1, int(n * frac))
+        if n <= 2 * k:
+            return self.mean()
+        trimmed = self.total - math.fsum(s[:k]) - math.fsum(s[n - k:])
+        return trimmed / (n - 2 * k)
+
+    def split_at(self, thr):
+        """Return the window's sorted values split into (<= thr, > thr)."""
+        i = bisect.bisect_right(self.ordered, thr)
+        return self.ordered[:i], self.ordered[i:]
+
+
+class IntervalStats:
+    """Incremental interval statistics for calculate_pattern_v2.
+
+    Keeps rolling windows over all intervals and over the even and odd
+    interval indices (the A/B phases). Each parity window holds the last
+    `window_n` intervals of that parity, and the overall window the last
+    2 * window_n, so all three cover the same span. `count` is the total
+    number of intervals ever pushed, which fixes the parity of the next one.
+    """
+
+    __slots__ = ('window_n', 'trim_frac', 'all', 'even', 'odd', 'count')
+
+    def __init__(self, window_n=8, trim_frac=0.2):
+        self.window_n = max(2, int(window_n))
+        self.trim_frac = float(trim_frac)
+        self.all = RollingStats(2 * self.window_n)
+        self.even = RollingStats(self.window_n)
+        self.odd = RollingStats(self.window_n)
+        self.count = 0
+
+    def push(self, interval):
+        (self.even if self.count % 2 == 0 else self.odd).push(interval)
+        self.all.push(interval)
+        self.count += 1
+
+    @classmethod
+    def from_intervals(cls, intervals, window_n=8, trim_frac=0.2, start=0):
+        """Build from a list whose first value is interval number `start`."""
+        stats = cls(window_n, trim_frac)
+        # Only the tail can still be inside the windows; the absolute count
+        # keeps each value on its parity
+        skip = max(0, len(intervals) - 2 * stats.window_n)
+        stats.count = start + skip
+        for v in intervals[skip:]:
+            stats.push(v)
+        return stats
+
+
+def autocorrelation(values, max_lag):
+    """Normalized autocorrelation of `values` at lags 0..max_lag, via FFT.
+
+    Each lag is averaged over its own number of pairs, so long lags on a
+    short series are not biased towards zero. Returns an array of
+    max_lag + 1 values (lag 0 is 1.0); a constant series gives all zeros.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = x.size
+    max_lag = max(0, min(int(max_lag), n - 1))
+    if n == 0:
+        return np.zeros(1)
+    x = x - x.mean()
+    size = 1 << (2 * n - 1).bit_length()
+    spec = np.fft.rfft(x, size)
+    acov = np.fft.irfft(spec * spec.conj(), size)[:max_lag + 1]
+    acov /= np.arange(n, n - max_lag - 1, -1)
+    if acov[0] <= 1e-18:
+        return np.zeros(max_lag + 1)
+    return acov / acov[0]
+
+
+def detect_cycle(values, max_k=6, start=0, min_acf=0.5, max_cv=20.0, min_distinct=15.0,
+                 min_cycles=2, min_explained=0.95):
+    """Find the shortest repeating cycle of interval lengths in `values`.
+
+    Candidate cycle lengths k = 2..max_k are the lags whose autocorrelation
+    reaches `min_acf`, tried shortest first (multiples of the true cycle
+    correlate too). A candidate is accepted when every phase has at least
+    `min_cycles` samples, each phase's spread is below `max_cv` percent of
+    its mean, the phase means differ by more than `min_distinct` percent and
+    they explain at least `min_explained` of the variance (short noisy
+    series otherwise fit a cycle by chance).
+    `start` is the absolute index of values[0], so the phase of interval i
+    is i % k regardless of how much history was dropped.
+
+    Returns (k, phase_means, score) with phase_means[p] the mean of the
+    intervals whose index % k == p, or None.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = x.size
+    max_k = min(int(max_k), n // max(1, int(min_cycles)))
+    if max_k < 2:
+        return None
+    centered = x - x.mean()
+    total_ss = float(centered @ centered)
+    if total_ss <= 1e-18:
+        return None
+    acf = autocorrelation(x, max_k)
+    for k in np.flatnonzero(acf[2:] >= min_acf) + 2:
+        phase = np.arange(start, start + n) % k
+        counts = np.bincount(phase, minlength=k)
+        if counts.min() < min_cycles:
+            continue
+        means = np.bincount(phase, weights=x, minlength=k) / counts
+        if means.min() <= 0.0:
+            continue
+        resid = x - means[phase]
+        var = np.bincount(phase, weights=resid * resid, minlength=k) / np.maximum(counts - 1, 1)
+        cv = np.sqrt(var) / means * 100.0
+        distinct = (means.max() - means.min()) / means.max() * 100.0
+        explained = 1.0 - float(resid @ resid) / total_ss
+        if cv.max() < max_cv and distinct > min_distinct and explained >= min_explained:
+            return int(k), means.tolist(), float(acf[k])
+    return None
+
+
+class OnsetTracker:
+    """Kalman filter over onset time, period and drift.
+
+    State is (t, period, drift): `t` the filtered time of the last onset,
+    `period` the current base interval and `drift` its change per interval.
+    Interval i lasts ratios[i % k] * period, so one filter follows single
+    intervals (ratios (1,)), A/B alternations and longer cycles, and a wheel
+    that speeds up or slows down stretches every phase together. Each onset
+    is one predict/update step; predict() gives the next onset and its
+    standard deviation.
+
+    Noise terms are standard deviations in seconds: `meas_s` for the onset
+    measurement, `phase_s`, `period_s` and `drift_s` for how far the true
+    onset, period and drift may wander per interval.
+    """
+
+    __slots__ = ('ratios', 'x', 'cov', 'q', 'r', 'updates', 'rejects', 'gate')
+
+    def __init__(self, t0, period, ratios=(1.0,), meas_s=0.002, phase_s=0.001, period_s=0.001,
+                 drift_s=0.0002, gate_sigmas=6.0):
+        self.ratios = tuple(float(v) for v in ratios)
+        self.x = np.array([float(t0), float(period), 0.0])
+        self.r = float(meas_s) ** 2
+        self.q = np.diag([float(phase_s) ** 2, float(period_s) ** 2, float(drift_s) ** 2])
+        # Period known to a few percent from learning, drift unknown
+        self.cov = np.diag([self.r, (0.05 * float(period)) ** 2, (0.01 * float(period)) ** 2])
+        self.gate = float(gate_sigmas)
+        self.updates = 0
+        self.rejects = 0
+
+    @property
+    def period(self):
+        return float(self.x[1])
+
+    @property
+    def drift(self):
+        return float(self.x[2])
+
+    def _step(self, index):
+        r = self.ratios[index % len(self.ratios)]
+        f = np.array([[1.0, r, 0.0], [0.0, 1.0, 1.0], [0.0, 0.0, 1.0]])
+        return f @ self.x, f @ self.cov @ f.T + self.q
+
+    def predict(self, index):
+        """Return (onset time, sigma) for the end of interval number `index`."""
+        x, cov = self._step(index)
+        return float(x[0]), float(np.sqrt(cov[0, 0]))
+
+    def update(self, ts, index):
+        """Fold in the onset `ts` that ended interval number `index`.
+
+        An onset more than `gate` sigmas off the prediction (missed onset,
+        speed change) is not folded in; the phase is re-anchored on it and
+        the tracker has to settle again. Returns whether it was accepted.
+        """
+        x, cov = self._step(index)
+        s = cov[0, 0] + self.r
+        innovation = float(ts) - x[0]
+        if self.updates and innovation * innovation > self.gate * self.gate * s:
+            self.x[0] = float(ts)
+            self.cov[0, :] = 0.0
+            self.cov[:, 0] = 0.0
+            self.cov[0, 0] = self.r
+            self.cov[1, 1] = max(self.cov[1, 1], (0.05 * self.x[1]) ** 2)
+            self.updates = 0
+            self.rejects += 1
+            return False
+        gain = cov[:, 0] / s
+        self.x = x + gain * innovation
+        self.cov = cov - np.outer(gain, cov[0, :])
+        self.updates += 1
+        return True
+
+
+class Cusum:
+    """Two-sided CUSUM change detector over normalized residuals.
+
+    Each side accumulates residuals beyond `drift` (in units of the
+    residual scale) and fires once its sum exceeds `threshold`. The index
+    at which the firing side last started accumulating from zero is the
+    change-point estimate: samples from there on belong to the new regime.
+    """
+
+    __slots__ = ('drift', 'threshold', 'pos', 'neg', 'pos_start', 'neg_start')
+
+    def __init__(self, drift=0.5, threshold=5.0):
+        self.drift = float(drift)
+        self.threshold = float(threshold)
+        self.reset()
+
+    def reset(self):
+        self.pos = 0.0
+        self.neg = 0.0
+        self.pos_start = None
+        self.neg_start = None
+
+    def update(self, z, index):
+        """Add residual `z` of sample `index`.
+
+        Returns (change index, +1 or -1) when a side fires, else None. The
+        sign says whether samples came out longer (+1) or shorter (-1).
+        """
+        if self.pos == 0.0:
+            self.pos_start = index
+        if self.neg == 0.0:
+            self.neg_start = index
+        self.pos = max(0.0, self.pos + z - self.drift)
+        self.neg = max(0.0, self.neg - z - self.drift)
+        if self.pos > self.threshold:
+            start = self.pos_start
+            self.reset()
+            return start, 1
+        if self.neg > self.threshold:
+            start = self.neg_start
+            self.reset()
+            return start, -1
+        return None
+
+
+def cluster_durations(values, max_classes=4, max_cv=10.0, min_gap=15.0, iters=20):
+    """Group interval lengths into a few duration classes with 1-D k-means.
+
+    Tries k = 1..max_classes (centers seeded at evenly spaced quantiles)
+    and returns the first clustering where every class spreads less than
+    `max_cv` percent around its center and neighbouring centers differ by
+    more than `min_gap` percent. Returns (centers, labels) with centers
+    ascending, or None.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    if x.size == 0 or x.min() <= 0.0:
+        return None
+    for k in range(1, min(int(max_classes), x.size) + 1):
+        centers = np.quantile(x, (np.arange(k) + 0.5) / k)
+        for _ in range(iters):
+            labels = np.abs(x[:, None] - centers[None, :]).argmin(axis=1)
+            counts = np.bincount(labels, minlength=k)
+            if counts.min() == 0:
+                break
+            updated = np.bincount(labels, weights=x, minlength=k) / counts
+            if np.allclose(updated, centers, rtol=0.0, atol=1e-9):
+                break
+            centers = updated
+        labels = np.abs(x[:, None] - centers[None, :]).argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        if counts.min() == 0:
+            continue
+        resid = x - centers[labels]
+        spread = np.sqrt(np.bincount(labels, weights=resid * resid, minlength=k) / counts)
+        gaps = np.diff(centers) / centers[1:] * 100.0
+        if (spread / centers * 100.0).max() < max_cv and (k == 1 or gaps.min() > min_gap):
+            return centers, labels
+    return None
+
+
+class IntervalMarkov:
+    """Markov chain over duration classes of the interval sequence.
+
+    `centers` are the class durations (ascending) and `counts[h, j]` how
+    often class j followed history h, where h encodes the previous
+    `order` classes as a base-k number (most recent last). Predictions
+    back off to the order-1 row, then the class frequencies, when a
+    history has not been seen `min_support` times.
+    """
+
+    __slots__ = ('centers', 'order', 'counts', 'first', 'freq', 'min_support', 'accuracy')
+
+    def __init__(self, centers, labels, order=1, min_support=2):
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.order = max(1, int(order))
+        self.min_support = int(min_support)
+        k = self.centers.size
+        labels = np.asarray(labels, dtype=np.intp)
+        self.counts = _transition_counts(labels, k, self.order)
+        self.first = self.counts if self.order == 1 else _transition_counts(labels, k, 1)
+        self.freq = np.bincount(labels, minlength=k)
+        # In-sample rate at which the most likely next class (with the same
+        # back-off as predict) was right
+        n = labels.size - self.order
+        if n > 0:
+            code = np.zeros(n, dtype=np.intp)
+            for i in range(self.order):
+                code = code * k + labels[i:i + n]
+            prev = labels[self.order - 1:self.order - 1 + n]
+            guess = np.where(self.first.sum(axis=1)[prev] >= self.min_support,
+                             self.first.argmax(axis=1)[prev], self.freq.argmax())
+            guess = np.where(self.counts.sum(axis=1)[code] >= self.min_support,
+                             self.counts.argmax(axis=1)[code], guess)
+            self.accuracy = float(np.mean(guess == labels[self.order:]))
+        else:
+            self.accuracy = 0.0
+
+    def classify(self, values):
+        """Nearest duration class of each value."""
+        x = np.asarray(values, dtype=np.float64)
+        return np.abs(x[:, None] - self.centers[None, :]).argmin(axis=1)
+
+    def _row(self, history):
+        k = self.centers.size
+        if len(history) >= self.order:
+            code = 0
+            for c in history[len(history) - self.order:]:
+                code = code * k + int(c)
+            row = self.counts[code]
+            if row.sum() >= self.min_support:
+                return row
+        if len(history):
+            row = self.first[int(history[-1])]
+            if row.sum() >= self.min_support:
+                return row
+        return self.freq
+
+    def predict(self, recent):
+        """Return (next interval, probability) given the most recent intervals."""
+        history = self.classify(recent[-self.order:]) if len(recent) else []
+        row = self._row(history)
+        total = row.sum()
+        if total <= 0:
+            return None
+        j = int(row.argmax())
+        return float(self.centers[j]), float(row[j] / total)
+
+
+def _transition_counts(labels, k, order):
+    """(k**order, k) counts of each class following each length-`order` history."""
+    n = labels.size - order
+    if n <= 0:
+        return np.zeros((k ** order, k), dtype=np.int64)
+    code = np.zeros(n, dtype=np.intp)
+    for i in range(order):
+        code = code * k + labels[i:i + n]
+    return np.bincount(code * k + labels[order:], minlength=k ** order * k).reshape(k ** order, k)
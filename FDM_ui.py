@@ -2,6 +2,9 @@ import time
 import cv2
 import numpy as np
 
+import FDM_detection as fdm_detection
+from FDM_pattern import AreaTrack
+
 
 def select_area(self):
     """Area selection UI."""
@@ -97,6 +100,153 @@ def select_area(self):
     return self.selected_area
 
 
+def _status_background():
+    """Blank status panel with the static controls legend already drawn."""
+    base = np.zeros((520, 700, 3), dtype=np.uint8)
+    y_start = 400
+    cv2.putText(base, "CONTROLS:", (10, y_start), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    cv2.putText(base, "'l' = Learning mode", (10, y_start + 30), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(base, "'p' = Prediction mode", (10, y_start + 50), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(base, "'r' = Reset pattern", (10, y_start + 70), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(base, "'s' = New area", (10, y_start + 90), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(base, "'q' = Quit", (10, y_start + 110), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return base
+
+
+def _render_status(self, region, threaded):
+    """Draw the monitor status panel (ROI preview, state, mode, controls).
+
+    The panel, preview and controls background are allocated once and
+    reused, so redrawing does not allocate per frame.
+    """
+    if getattr(self, '_status_base', None) is None:
+        self._status_base = _status_background()
+        self._status_image = np.empty_like(self._status_base)
+    channels = region.shape[2]
+    preview = getattr(self, '_status_preview', None)
+    if preview is None or preview.shape[2] != channels:
+        preview = np.empty((180, 240, channels), dtype=np.uint8)
+        self._status_preview = preview
+    cv2.resize(region, (240, 180), dst=preview)
+    status_image = self._status_image
+    np.copyto(status_image, self._status_base)
+    # BGRA capture: drop alpha, BGR is what imshow expects
+    status_image[:180, :240] = preview[:, :, :3]
+
+    # Current state
+    cv2.putText(status_image, f"STATE: {self.current_state}", (270, 50), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(status_image, f"FPS: {self.current_fps}", (270, 90), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    if threaded:
+        cv2.putText(status_image, f"Dropped: {self.frames_dropped}", (270, 120),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    checked = self.classify_skips + self.classify_runs
+    if checked:
+        cv2.putText(status_image, f"Skipped: {100.0 * self.classify_skips / checked:.0f}% ({self.classify_skips})",
+                   (470, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    if getattr(self, 'governor_enabled', False):
+        cv2.putText(status_image, f"CAPTURE: {self.governor_state}", (270, 170),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    if self.pipeline_delay_s is not None:
+        cv2.putText(status_image, f"Delay: {self.pipeline_delay_s * 1000.0:.1f}ms", (270, 145),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    # Mode status
+    if self.learning_mode: 
+        cv2.putText(status_image, "MODE: LEARNING", (270, 220), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        cv2.putText(status_image, "Recording gray patterns...", (270, 260), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    elif self.prediction_active:
+        cv2.putText(status_image, "MODE: PREDICTION", (270, 220), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        if self.pattern_established:
+            cv2.putText(status_image, "AI predicting timing!", (270, 260), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+            accuracy = (self.successful_predictions / max(1, self.total_predictions)) * 100
+            cv2.putText(status_image, f"Accuracy: {accuracy:.1f}%", (270, 290), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        else:
+            cv2.putText(status_image, "Need pattern first!", (270, 260), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+    else:
+        cv2.putText(status_image, "MODE: STANDBY", (270, 220), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (128, 128, 128), 2)
+
+    return status_image
+
+
+def _process_state(self, onset_ts):
+    """Feed the current state into pattern learning and press scheduling.
+
+    `self` is the detector or a per-area AreaTrack; `onset_ts` is the
+    interpolated onset time when this frame is a WHITE->GRAY edge.
+    """
+    # Learning mode: Record gray appearances
+    if self.learning_mode and self.current_state == "GRAY" and self.last_state == "WHITE":
+        self.record_gray_appearance_safe(onset_ts)
+    # Re-learning after a detected pattern change: prediction stays on, keep recording
+    elif (self.prediction_active and not self.pattern_established
+            and self.current_state == "GRAY" and self.last_state == "WHITE"):
+        self.record_gray_appearance_safe(onset_ts)
+
+    # Prediction mode: Schedule predictive presses
+    if self.prediction_active and self.pattern_established:
+        if self.current_state == "GRAY" and self.last_state == "WHITE":
+            # Without the restart after each press, re-arm once the cooldown passed
+            if (not self.pattern.config.stop_after_press and self.pressed_this_event
+                    and time.perf_counter() >= self.press_lock_until):
+                self.pressed_this_event = False
+            # Update pattern with new data
+            self.record_gray_appearance_safe(onset_ts)
+            # Cancel any previously scheduled presses; new event boundary
+            try:
+                self.invalidate_predictions()
+            except Exception:
+                pass
+            # Optional: adaptive phase correction for A/B slow arrival timing
+            # (not needed when the onset tracker produced the slow start)
+            # IMPORTANT: adjust phase before clearing the expectation flag
+            try:
+                cfg = self.pattern.config
+                if (self._ab_expect_slow_next and self._ab_slow_start_time is not None
+                        and self._target_window is None):
+                    now_ts = self.gray_timestamps[-1]
+                    delta_ms = (now_ts - float(self._ab_slow_start_time)) * 1000.0
+                    error_ms = delta_ms - float(cfg.ab_target_after_ms)
+                    phase_ms = float(self.ab_phase_ms or 0.0) + float(cfg.ab_phase_alpha) * error_ms
+                    phase_ms = max(float(cfg.ab_phase_min), min(float(cfg.ab_phase_max), phase_ms))
+                    self.ab_phase_ms = phase_ms
+                    if cfg.debug_ab:
+                        print(f"AB debug: phase adjust error={error_ms:.0f}ms -> phase={phase_ms:.0f}ms")
+            except Exception:
+                pass
+            # Clear expectation after processing phase adjustment logic
+            try:
+                self._ab_expect_slow_next = False
+            except Exception:
+                pass
+            # Schedule next prediction (guard against double-scheduling for same event)
+            next_time = self.predict_next_target_time()
+            if next_time:
+                from_ts = self.gray_timestamps[-1] if self.gray_timestamps else None
+                # Store ETA for UI/logging
+                self._next_predicted_at = next_time
+                self._next_predicted_from = from_ts
+                # Only schedule once per event (multi-ROI: only the pressing area)
+                if (getattr(self, '_last_schedule_from_ts', None) != from_ts
+                        and getattr(self, 'schedules_presses', True)):
+                    self._last_schedule_from_ts = from_ts
+                    self.schedule_predictive_press_safe(next_time)
+
+
 def monitor_area(self, area):
     """Monitor selected area with predictive timing."""
     print(f"\nPREDICTIVE TIMING SYSTEM")
@@ -110,123 +260,70 @@ def monitor_area(self, area):
     self.monitoring = True
     x1, y1, x2, y2 = area
 
-    cv2.namedWindow("PREDICTIVE AI", cv2.WINDOW_NORMAL)
-    cv2.resizeWindow("PREDICTIVE AI", 700, 600)
+    show_ui = bool(getattr(self, 'show_ui', True))
+    if show_ui:
+        cv2.namedWindow("PREDICTIVE AI", cv2.WINDOW_NORMAL)
+        cv2.resizeWindow("PREDICTIVE AI", 700, 600)
+
+    threaded = bool(getattr(self, 'capture_threaded', False)) and getattr(self, 'frame_source', None) is None
+    frame_skip = bool(getattr(self, 'frame_skip_enabled', True))
+    self._skip_ref = None
+    self.classify_skips = 0
+    self.classify_runs = 0
+    # Knobs changed since the last reset take effect for this session
+    self.refresh_detection_config()
+    self.refresh_pattern_config()
+    self.select_active_mask(area)
+    if threaded:
+        self.start_capture_thread(area)
 
     try:
         while self.monitoring:
-            frame = self.ultra_fast_capture()
-            region = frame[y1:y2, x1:x2]
+            if threaded:
+                region = self.latest_frame()
+                if region is None:
+                    if show_ui:
+                        cv2.waitKey(1)
+                    if self.q_pressed:
+                        break
+                    continue
+            else:
+                idle = self.governor_delay()
+                if idle > 0.0:
+                    time.sleep(idle)
+                if getattr(self, 'roi_capture_mode', True):
+                    region = self.roi_capture(area)
+                else:
+                    frame = self.ultra_fast_capture()
+                    region = frame[y1:y2, x1:x2]
 
             if region.size == 0:
                 continue
 
-            # Classify current state
-            self.current_state = self.classify_region_state(region)
+            if getattr(self, 'record_dir', None):
+                self.record_frame(area, region)
 
-            # Learning mode: Record gray appearances
-            if self.learning_mode and self.current_state == "GRAY" and self.last_state == "WHITE":
-                self.record_gray_appearance_safe()
+            # Classify current state (unchanged ROI keeps the previous state)
+            if not (frame_skip and self.region_unchanged(region)):
+                self.current_state = self.classify_region_state(region)
+                self.observe_active_pixels(region)
+            self.track_gray_coverage()
+            onset_ts = None
+            if self.current_state == "GRAY" and self.last_state == "WHITE":
+                onset_ts = self.estimate_onset_time()
 
-            # Prediction mode: Schedule predictive presses
-            if self.prediction_active and self.pattern_established:
-                if self.current_state == "GRAY" and self.last_state == "WHITE":
-                    # Update pattern with new data
-                    self.record_gray_appearance_safe()
-                    # Cancel any previously scheduled presses; new event boundary
-                    try:
-                        self.invalidate_predictions()
-                    except Exception:
-                        pass
-                    # Optional: adaptive phase correction for A/B slow arrival timing
-                    # IMPORTANT: adjust phase before clearing the expectation flag
-                    try:
-                        if getattr(self, '_ab_expect_slow_next', False) and hasattr(self, '_ab_slow_start_time'):
-                            now_ts = self.gray_timestamps[-1]
-                            delta_ms = (now_ts - float(self._ab_slow_start_time)) * 1000.0
-                            target_ms = float(getattr(self, 'ab_target_after_ms', 6))
-                            error_ms = delta_ms - target_ms
-                            alpha = float(getattr(self, 'ab_phase_alpha', 0.4))
-                            phase_ms = float(getattr(self, 'ab_phase_ms', 0.0))
-                            phase_ms = phase_ms + alpha * error_ms
-                            pmin = float(getattr(self, 'ab_phase_min', -60))
-                            pmax = float(getattr(self, 'ab_phase_max', 60))
-                            phase_ms = max(pmin, min(pmax, phase_ms))
-                            self.ab_phase_ms = phase_ms
-                            if getattr(self, 'debug_ab', False):
-                                print(f"AB debug: phase adjust error={error_ms:.0f}ms -> phase={phase_ms:.0f}ms")
-                    except Exception:
-                        pass
-                    # Clear expectation after processing phase adjustment logic
-                    try:
-                        self._ab_expect_slow_next = False
-                    except Exception:
-                        pass
-                    # Schedule next prediction (guard against double-scheduling for same event)
-                    next_time = self.predict_next_target_time()
-                    if next_time:
-                        from_ts = self.gray_timestamps[-1] if self.gray_timestamps else None
-                        # Store ETA for UI/logging
-                        self._next_predicted_at = next_time
-                        self._next_predicted_from = from_ts
-                        # Only schedule once per event
-                        if getattr(self, '_last_schedule_from_ts', None) != from_ts:
-                            self._last_schedule_from_ts = from_ts
-                            self.schedule_predictive_press_safe(next_time)
+            _process_state(self, onset_ts)
+            self.publish_governor_target()
+            if self._active_seen is not None:
+                self.finalize_active_mask()
 
             # Update last state
             self.last_state = self.current_state
 
             # Display status
-            display_region = cv2.resize(region, (240, 180))
-            status_image = np.zeros((520, 700, 3), dtype=np.uint8)
-            status_image[:180, :240] = display_region
-
-            # Current state
-            cv2.putText(status_image, f"STATE: {self.current_state}", (270, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(status_image, f"FPS: {self.current_fps}", (270, 90), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-
-            # Mode status
-            if self.learning_mode: 
-                cv2.putText(status_image, "MODE: LEARNING", (270, 220), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                cv2.putText(status_image, "Recording gray patterns...", (270, 260), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            elif self.prediction_active:
-                cv2.putText(status_image, "MODE: PREDICTION", (270, 220), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                if self.pattern_established:
-                    cv2.putText(status_image, "AI predicting timing!", (270, 260), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-                    accuracy = (self.successful_predictions / max(1, self.total_predictions)) * 100
-                    cv2.putText(status_image, f"Accuracy: {accuracy:.1f}%", (270, 290), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                else:
-                    cv2.putText(status_image, "Need pattern first!", (270, 260), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-            else:
-                cv2.putText(status_image, "MODE: STANDBY", (270, 220), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (128, 128, 128), 2)
-
-            # Controls
-            y_start = 400
-            cv2.putText(status_image, "CONTROLS:", (10, y_start), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            cv2.putText(status_image, "'l' = Learning mode", (10, y_start + 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(status_image, "'p' = Prediction mode", (10, y_start + 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(status_image, "'r' = Reset pattern", (10, y_start + 70), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(status_image, "'s' = New area", (10, y_start + 90), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(status_image, "'q' = Quit", (10, y_start + 110), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-            cv2.imshow("PREDICTIVE AI", status_image)
-            cv2.waitKey(1)
+            if show_ui:
+                cv2.imshow("PREDICTIVE AI", _render_status(self, region, threaded))
+                cv2.waitKey(1)
 
             # Handle controls
             if self.l_pressed:
@@ -246,12 +343,15 @@ def monitor_area(self, area):
 
             if self.r_pressed:
                 self.reset_pattern_learning()
+                self.reset_active_mask()
                 self.learning_mode = True
                 self.prediction_active = False
                 self.reset_key_flags()
 
             if self.s_pressed:
                 cv2.destroyWindow("PREDICTIVE AI")
+                if threaded:
+                    self.stop_capture_thread()
                 new_area = self.select_area()
                 if new_area:
                     # Track new area in this session
@@ -266,12 +366,18 @@ def monitor_area(self, area):
                         pass
                     area = new_area
                     x1, y1, x2, y2 = area
+                    # Scratch buffers are sized per ROI; let them follow the new area
+                    self._det_buffers = None
+                    self._skip_ref = None
+                    self.select_active_mask(area)
                     self.reset_pattern_learning()
                     cv2.namedWindow("PREDICTIVE AI", cv2.WINDOW_NORMAL)
                     cv2.resizeWindow("PREDICTIVE AI", 700, 600)
                 else:
                     cv2.namedWindow("PREDICTIVE AI", cv2.WINDOW_NORMAL)
                     cv2.resizeWindow("PREDICTIVE AI", 700, 600)
+                if threaded:
+                    self.start_capture_thread(area)
                 self.reset_key_flags()
 
             if self.q_pressed:
@@ -280,8 +386,132 @@ def monitor_area(self, area):
             # Keep last state for edge detection
             self.last_state = self.current_state
 
+    except KeyboardInterrupt:
+        print("\nPredictive system stopped.")
+    finally:
+        if threaded:
+            self.stop_capture_thread()
+        self.stop_recording()
+
+    if show_ui:
+        cv2.destroyWindow("PREDICTIVE AI")
+    self.monitoring = False
+
+
+def _render_multi_status(self, tracks):
+    """Draw one status line per tracked area."""
+    height = max(200, 60 + 22 * len(tracks))
+    status_image = np.zeros((height, 700, 3), dtype=np.uint8)
+    cv2.putText(status_image, f"MULTI-ROI  FPS: {self.current_fps}", (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    for n, track in enumerate(tracks):
+        if track.pattern_established and track.pattern_type == "alternating":
+            pattern = f"A/B {track.alt_interval_a:.3f}/{track.alt_interval_b:.3f}s"
+        elif track.pattern_established and track.pattern_type == "cycle":
+            pattern = "cycle " + "/".join(f"{v:.3f}" for v in track.cycle_intervals) + "s"
+        elif track.pattern_established and track.pattern_type == "markov":
+            pattern = "markov " + "/".join(f"{v:.3f}" for v in track.markov_model.centers) + "s"
+        elif track.pattern_established:
+            pattern = f"single {track.average_interval:.3f}s"
+        else:
+            pattern = f"learning ({len(track.intervals)})"
+        if track.pattern_established and track.active_predictor:
+            pattern += f" [{track.active_predictor}]"
+        color = (0, 255, 0) if track.schedules_presses else (255, 255, 255)
+        cv2.putText(status_image, f"{n + 1:2d}. {track.area}  {track.current_state:<7}  {pattern}",
+                   (10, 60 + 22 * n), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
+    return status_image
+
+
+def monitor_areas(self, areas):
+    """Monitor many areas from a single grab per frame.
+
+    The bounding box of all areas is captured once, every ROI is classified
+    in one vectorized pass (classify_regions_batch), restricted to each
+    area's learned active-pixel mask when one was saved, and each area keeps
+    its own AreaTrack pattern state. The tracks live on the detector keyed
+    by area (`_area_tracks`), so learning survives the restart after each
+    press. All areas learn and predict continuously; only the first one
+    schedules presses.
+
+    Unlike monitor_area this loop grabs on the calling thread at full rate:
+    frame skipping, the capture thread, the capture-rate governor, frame
+    recording and active-mask learning are not used here.
+    """
+    areas = [tuple(int(v) for v in a) for a in areas]
+    if not areas:
+        return
+    print(f"\nMULTI-ROI MONITORING: {len(areas)} areas (pressing on {areas[0]})")
+    print("'r' = Reset patterns   'q' = Quit")
+
+    self.reset_key_flags()
+    self.monitoring = True
+    self.refresh_detection_config()
+    bbox = (min(a[0] for a in areas), min(a[1] for a in areas),
+            max(a[2] for a in areas), max(a[3] for a in areas))
+    rel_areas = [(a[0] - bbox[0], a[1] - bbox[1], a[2] - bbox[0], a[3] - bbox[1]) for a in areas]
+    tracks = []
+    for n, a in enumerate(areas):
+        track = self._area_tracks.get(a)
+        if track is None:
+            track = self._area_tracks[a] = AreaTrack(self, a)
+        track.auto_predict = self.auto_predict
+        track.schedules_presses = (n == 0)
+        # New session: drop the previous session's press gating
+        track.invalidate_predictions()
+        track.pressed_this_event = False
+        track.press_lock_until = 0.0
+        track._last_schedule_from_ts = None
+        track.last_state = "UNKNOWN"
+        tracks.append(track)
+    roi_index = None
+    index_shape = None
+
+    show_ui = bool(getattr(self, 'show_ui', True))
+    if show_ui:
+        cv2.namedWindow("PREDICTIVE AI", cv2.WINDOW_NORMAL)
+
+    try:
+        while self.monitoring:
+            frame = self.roi_capture(bbox)
+            if frame.size == 0:
+                continue
+            if index_shape != frame.shape:
+                masks = [self._area_masks.get(a) for a in areas]
+                roi_index = fdm_detection.build_roi_index(rel_areas, frame.shape, masks)
+                index_shape = frame.shape
+            codes, gray, white, totals = fdm_detection.classify_regions_batch(self, frame, roi_index)
+
+            for n, track in enumerate(tracks):
+                track.current_state = fdm_detection.STATE_NAMES[codes[n]]
+                track.last_gray_count = int(gray[n])
+                track.last_white_count = int(white[n])
+                track.last_total_px = int(totals[n])
+                fdm_detection.track_gray_coverage(track)
+                onset_ts = None
+                if track.current_state == "GRAY" and track.last_state == "WHITE":
+                    onset_ts = fdm_detection.estimate_onset_time(track)
+                _process_state(track, onset_ts)
+                track.last_state = track.current_state
+
+            # Mirror the pressing area so the scheduler and UI see its state
+            self.current_state = tracks[0].current_state
+
+            if show_ui:
+                cv2.imshow("PREDICTIVE AI", _render_multi_status(self, tracks))
+                cv2.waitKey(1)
+
+            if self.r_pressed:
+                for track in tracks:
+                    track.reset_pattern_learning()
+                self.reset_key_flags()
+
+            if self.q_pressed:
+                break
+
     except KeyboardInterrupt:
         print("\nPredictive system stopped.")
 
-    cv2.destroyWindow("PREDICTIVE AI")
+    if show_ui:
+        cv2.destroyWindow("PREDICTIVE AI")
     self.monitoring = False